@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.cart'
+
+    def ready(self):
+        # 注册信号处理函数
+        from apps.cart import signals  # noqa: F401
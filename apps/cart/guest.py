@@ -0,0 +1,91 @@
+import json
+
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cart.models import Cart, CartItem, upsert_cart_items
+from apps.cart.summary import CartSummary, invalidate_cart_summary
+from apps.pets.models import Pet
+
+# 游客购物车保存在签名Cookie中：浏览期间不写数据库，登录/注册时再合并到用户购物车
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'apps.cart.guest'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+GUEST_CART_MAX_ITEMS = 50  # 限制条目数，避免Cookie过大
+
+
+class GuestCartItem:
+    """与CartItem结构一致的游客购物车项，供购物车模板直接使用"""
+
+    def __init__(self, pet, quantity):
+        self.pet = pet
+        self.quantity = quantity
+
+    def get_total_price(self):
+        return self.pet.price * self.quantity
+
+
+def load_guest_cart(request):
+    """读取游客购物车：{宠物ID: 数量}，签名校验失败或格式错误时视为空"""
+    try:
+        raw = request.get_signed_cookie(GUEST_CART_COOKIE, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+        data = json.loads(raw)
+        return {int(pet_id): int(quantity) for pet_id, quantity in data.items() if int(quantity) > 0}
+    except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+        return {}
+
+
+def save_guest_cart(response, guest_cart):
+    """将游客购物车写回签名Cookie，为空时删除Cookie"""
+    if not guest_cart:
+        response.delete_cookie(GUEST_CART_COOKIE)
+        return
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE,
+        json.dumps({str(pet_id): quantity for pet_id, quantity in guest_cart.items()}, separators=(',', ':')),
+        salt=GUEST_CART_SALT,
+        max_age=GUEST_CART_MAX_AGE,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def guest_cart_summary(request):
+    guest_cart = load_guest_cart(request)
+    return CartSummary(item_count=sum(guest_cart.values()), item_kind=len(guest_cart))
+
+
+def guest_cart_items(guest_cart):
+    """按加入顺序组装游客购物车项（一次查询取出所有宠物）"""
+    pets = Pet.objects.in_bulk(list(guest_cart))
+    return [GuestCartItem(pets[pet_id], quantity) for pet_id, quantity in guest_cart.items() if pet_id in pets]
+
+
+def merge_guest_cart(request, response, user):
+    """
+    登录/注册成功后将游客购物车合并进用户购物车，一条批量upsert写入，随后清除Cookie
+    用户购物车中已有的宠物取两边数量的较大值，而不是相加（同一宠物不能重复加入购物车）
+    :return: 合并的条目数
+    """
+    guest_cart = load_guest_cart(request)
+    if not guest_cart:
+        return 0
+    # 过滤掉浏览期间已下架（删除）的宠物
+    pet_ids = set(Pet.objects.filter(id__in=list(guest_cart)).values_list('id', flat=True))
+    now = timezone.now()
+    with transaction.atomic():
+        # 锁定购物车行，读出的已有数量在合并期间不会被同一用户的其它批量操作改写
+        cart, created = Cart.objects.select_for_update().get_or_create(user_id=user.id)
+        existing = dict(
+            CartItem.objects.filter(cart=cart, pet_id__in=pet_ids).values_list('pet_id', 'quantity')
+        )
+        items = [
+            CartItem(cart=cart, pet_id=pet_id, quantity=quantity, created_at=now, updated_at=now)
+            for pet_id, quantity in guest_cart.items()
+            if pet_id in pet_ids and quantity > existing.get(pet_id, 0)
+        ]
+        upsert_cart_items(items)
+    transaction.on_commit(lambda: invalidate_cart_summary(user.id))
+    save_guest_cart(response, {})
+    return len(items)
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Coalesce
 
 from apps.pets.models import Pet
 from apps.users.models import User
@@ -19,13 +21,20 @@ class Cart(models.Model):
         if self.user:
             return f"{self.user.username}的购物车"
 
+    def get_totals(self):
+        """一次聚合查询（关联Pet）同时计算商品总数和总价"""
+        return self.items.aggregate(
+            item_count=Coalesce(Sum('quantity'), 0),
+            total_price=Coalesce(Sum(F('quantity') * F('pet__price'), output_field=FloatField()), 0.0),
+        )
+
     def get_total_price(self):
         """计算购物车总价"""
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.get_totals()['total_price']
 
     def get_item_count(self):
         """计算购物车商品总数"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()['item_count']
 
 
 class CartItem(models.Model):
@@ -63,4 +72,21 @@ class CartItem(models.Model):
 
     def get_total_price(self):
         """计算商品项总价"""
-        return self.pet.price * self.quantity
\ No newline at end of file
+        return self.pet.price * self.quantity
+
+def upsert_cart_items(items):
+    """
+    批量写入购物车项：(cart, pet)已存在时改写数量和更新时间，一条INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE
+    用于未加锁的加入购物车等写入可能已并发插入同一宠物的场景，避免唯一约束冲突
+    :param items: 未保存的CartItem列表（需显式设置created_at/updated_at，bulk_create不会处理auto_now）
+    """
+    if not items:
+        return
+    # MySQL的ON DUPLICATE KEY UPDATE不支持指定冲突字段，由唯一约束(cart, pet)自动判断
+    unique_fields = ['cart', 'pet'] if connection.features.supports_update_conflicts_with_target else None
+    CartItem.objects.bulk_create(
+        items,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=['quantity', 'updated_at'],
+    )
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.cart.models import Cart, CartItem
+from apps.cart.summary import invalidate_cart_summary
+
+
+def _cart_user_id(cart_id):
+    return Cart.objects.filter(pk=cart_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, **kwargs):
+    # 视图中通过cart.items创建/删除购物车项时cart已在实例上缓存，无需再查询
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = _cart_user_id(instance.cart_id)
+    # 事务提交后再失效缓存，避免提交前被其它请求用旧数据重新写入缓存
+    transaction.on_commit(lambda: invalidate_cart_summary(user_id))
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_cart_summary(user_id))
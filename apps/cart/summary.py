@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from apps.cart.models import CartItem
+
+CART_SUMMARY_TIMEOUT = 60 * 30
+
+
+def cart_summary_key(user_id):
+    return f'cart_summary:{user_id}'
+
+
+class CartSummary:
+    """购物车摘要：商品总件数与商品种类数"""
+
+    def __init__(self, item_count=0, item_kind=0):
+        self.item_count = item_count
+        self.item_kind = item_kind
+
+
+def get_cart_summary(user):
+    """获取用户的购物车摘要，优先读缓存，未命中时用一条聚合查询计算"""
+    if not user.is_authenticated:
+        return CartSummary()
+    key = cart_summary_key(user.id)
+    data = cache.get(key)
+    if data is None:
+        data = CartItem.objects.filter(cart__user_id=user.id).aggregate(
+            item_count=Coalesce(Sum('quantity'), 0),
+            item_kind=Count('pet', distinct=True),
+        )
+        cache.set(key, data, CART_SUMMARY_TIMEOUT)
+    return CartSummary(**data)
+
+
+def invalidate_cart_summary(user_id):
+    if user_id:
+        cache.delete(cart_summary_key(user_id))
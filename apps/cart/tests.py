@@ -1,3 +1,56 @@
+from datetime import date
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.cart.models import Cart, CartItem
+from apps.pets.models import Pet, PetImage
+from apps.users.models import User
+
+
+class CartPageQueryCountTests(TestCase):
+    """购物车页面的查询次数不随商品数量增长"""
+
+    # 会话、用户、购物车项(关联宠物)、购物车摘要聚合
+    EXPECTED_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='cart@petpals.com')
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_pets(self, count):
+        for i in range(count):
+            pet = Pet.objects.create(
+                species='猫咪', breed='布偶', name=f'宠物{i}', birth_date=date(2024, 1, 1),
+                weight=3, gender='公', description='描述', price=100 + i,
+            )
+            PetImage.objects.create(pet=pet, image='pets/default.jpg', is_primary=True)
+            CartItem.objects.create(cart=self.cart, pet=pet)
+
+    def assert_cart_page_queries(self, count):
+        self.add_pets(count)
+        cache.clear()
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('cart:cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart_items']), count)
+
+    def test_one_item(self):
+        self.assert_cart_page_queries(1)
+
+    def test_hundred_items(self):
+        self.assert_cart_page_queries(100)
 
-# Create your tests here.
+    def test_pets_without_primary_image_prefetch_once(self):
+        self.add_pets(10)
+        Pet.objects.update(primary_image='')
+        cache.clear()
+        with self.assertNumQueries(self.EXPECTED_QUERIES + 1):
+            response = self.client.get(reverse('cart:cart'))
+        self.assertEqual(response.status_code, 200)
@@ -7,4 +7,5 @@ urlpatterns = [
     path('add/<int:pet_id>/', views.add_pet_to_cart, name='add_pet_to_cart'),
     path('delete/<int:pet_id>/', views.delete_pet_to_cart, name='delete_pet_to_cart'),
     path('delete_selected/', views.delete_selected_pets, name='delete_selected_pets'),
+    path('batch/', views.batch_update_cart, name='batch_update_cart'),
 ]
\ No newline at end of file
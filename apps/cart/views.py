@@ -1,69 +1,98 @@
 import json
-from datetime import date
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from apps.cart.models import Cart, CartItem
-from apps.pets.models import Pet
-
-def calculate_pet_age(birth_date):
-    """计算宠物的年龄，返回格式化的年龄字符串"""
-    today = date.today()
-    # 计算年差
-    years = today.year - birth_date.year
-    # 计算月差，如果当前月份小于出生月份，则年减1
-    months = today.month - birth_date.month
-    if months < 0:
-        years -= 1
-        months += 12
-    # 如果宠物还不到1岁，只显示月份
-    if years == 0:
-        return f"{months}个月"
-    # 如果有月份差，同时显示年和月
-    elif months > 0:
-        return f"{years}岁{months}个月"
-    # 否则只显示年
-    else:
-        return f"{years}岁"
-
+from django.utils import timezone
+from apps.cart.guest import (
+    GUEST_CART_MAX_ITEMS, load_guest_cart, save_guest_cart, guest_cart_items,
+)
+from apps.cart.models import Cart, CartItem, upsert_cart_items
+from apps.cart.summary import invalidate_cart_summary
+from apps.pets.models import Pet, prefetch_primary_images
 
+BATCH_OPERATIONS = ('add', 'remove', 'set')
+BATCH_MAX_OPERATIONS = 200  # 单次批量操作的最大条数
 
 def cart(request):
     if not request.user.is_authenticated:
-        return redirect('users:user_login')
-    cart_items = CartItem.objects.filter(cart__user=request.user)
-    total_price = 0
-    for item in cart_items:
-        item.pet.age = calculate_pet_age(item.pet.birth_date)
-        total_price += item.pet.price * item.quantity
+        # 游客购物车：从签名Cookie中读取，不访问购物车表
+        cart_items = guest_cart_items(load_guest_cart(request))
+        total_price = sum(item.get_total_price() for item in cart_items)
+        return render(request, 'cart/cart.html', {'cart_items': cart_items, 'total_price': total_price})
+    # 关联查询宠物，未回填主图的宠物统一预取一次图片
+    cart_items = list(CartItem.objects.filter(cart__user=request.user).select_related('pet'))
+    prefetch_primary_images([item.pet for item in cart_items])
+    total_price = sum(item.pet.price * item.quantity for item in cart_items)
     return render(request, 'cart/cart.html', {'cart_items': cart_items, 'total_price': total_price})
 
 
-def add_pet_to_cart(request, pet_id):
-    # 检查用户是否登录
-    if not request.user.is_authenticated:
+def _add_pet_to_guest_cart(request, pet_id):
+    pet = get_object_or_404(Pet, id=pet_id)
+    guest_cart = load_guest_cart(request)
+    if pet.id in guest_cart:
         return JsonResponse({
             'success': False,
-            'message': '请先登录！',
+            'message': f'{pet.name} 已经在您的购物车中了！',
+            'item_count': sum(guest_cart.values())
+        })
+    if len(guest_cart) >= GUEST_CART_MAX_ITEMS:
+        return JsonResponse({
+            'success': False,
+            'message': '购物车已满，请登录后继续添加',
             'login_required': True
-        }, status=401)
+        })
+    guest_cart[pet.id] = 1
+    response = JsonResponse({
+        'success': True,
+        'message': f'{pet.name} 已成功加入购物车！',
+        'item_count': sum(guest_cart.values())
+    })
+    save_guest_cart(response, guest_cart)
+    return response
+
+
+def _delete_pets_from_guest_cart(request, pet_ids):
+    guest_cart = load_guest_cart(request)
+    deleted_count = 0
+    for pet_id in pet_ids:
+        if guest_cart.pop(pet_id, None) is not None:
+            deleted_count += 1
+    pets = guest_cart_items(guest_cart)
+    response = JsonResponse({
+        'success': deleted_count > 0,
+        'message': f'成功删除 {deleted_count} 件商品' if deleted_count else '该商品不在您的购物车中',
+        'item_count': sum(guest_cart.values()),
+        'total_price': sum(item.get_total_price() for item in pets)
+    })
+    save_guest_cart(response, guest_cart)
+    return response
+
+
+def add_pet_to_cart(request, pet_id):
+    if request.method == 'POST' and not request.user.is_authenticated:
+        return _add_pet_to_guest_cart(request, pet_id)
 
     if request.method == 'POST':
         pet = get_object_or_404(Pet, id=pet_id)
         cart, created = Cart.objects.get_or_create(user_id=request.user.id)
         # 检查宠物是否已在购物车中
         if CartItem.objects.filter(cart=cart, pet=pet).exists():
+            totals = cart.get_totals()
             return JsonResponse({
                 'success': False,
                 'message': f'{pet.name} 已经在您的购物车中了！',
-                'item_count': cart.get_item_count()
+                'item_count': totals['item_count'],
+                'total_price': totals['total_price']
             })
 
         # 创建新的购物车项，数量默认为1
         CartItem.objects.create(cart=cart, pet=pet, quantity=1)
+        totals = cart.get_totals()
         return JsonResponse({
             'success': True,
             'message': f'{pet.name} 已成功加入购物车！',
-            'item_count': cart.get_item_count()
+            'item_count': totals['item_count'],
+            'total_price': totals['total_price']
         })
 
     # 如果不是POST请求，返回错误
@@ -74,26 +103,23 @@ def add_pet_to_cart(request, pet_id):
 
 
 def delete_pet_to_cart(request, pet_id):
-    # 检查用户是否登录
-    if not request.user.is_authenticated:
-        return JsonResponse({
-            'success': False,
-            'message': '请先登录！',
-            'login_required': True
-        }, status=401)
+    if request.method == 'POST' and not request.user.is_authenticated:
+        return _delete_pets_from_guest_cart(request, [pet_id])
 
     if request.method == 'POST':
         pet = get_object_or_404(Pet, id=pet_id)
         cart = get_object_or_404(Cart, user=request.user)
 
         # 查找要删除的购物车项
-        cart_item = CartItem.objects.filter(cart=cart, pet=pet).first()
+        cart_item = cart.items.filter(pet=pet).first()
         if cart_item:
             cart_item.delete()
+            totals = cart.get_totals()
             return JsonResponse({
                 'success': True,
                 'message': f'{pet.name} 已从购物车移除',
-                'item_count': cart.get_item_count()
+                'item_count': totals['item_count'],
+                'total_price': totals['total_price']
             })
 
         return JsonResponse({
@@ -108,13 +134,6 @@ def delete_pet_to_cart(request, pet_id):
     }, status=405)
 
 def delete_selected_pets(request):
-    if not request.user.is_authenticated:
-        return JsonResponse({
-            'success': False,
-            'message': '请先登录！',
-            'login_required': True
-        }, status=401)
-
     if request.method == 'POST':
         try:
             # 获取选中的宠物ID列表
@@ -127,20 +146,23 @@ def delete_selected_pets(request):
                     'message': '请选择要删除的商品'
                 })
 
+            if not request.user.is_authenticated:
+                return _delete_pets_from_guest_cart(request, [int(pet_id) for pet_id in pet_ids])
+
             cart = get_object_or_404(Cart, user=request.user)
 
-            # 删除选中的购物车项
-            deleted_items = CartItem.objects.filter(cart=cart, pet_id__in=pet_ids)
-            deleted_count = deleted_items.count()
-            deleted_items.delete()
+            # 删除选中的购物车项（delete()返回删除数量，无需先count）；
+            # 经cart.items查询的购物车项已缓存cart，删除信号中不会再逐条查询所属用户
+            deleted_count, _ = cart.items.filter(pet_id__in=pet_ids).delete()
+            totals = cart.get_totals()
 
             return JsonResponse({
                 'success': True,
                 'message': f'成功删除 {deleted_count} 件商品',
-                'item_count': cart.get_item_count(),
-                'total_price': cart.get_total_price()
+                'item_count': totals['item_count'],
+                'total_price': totals['total_price']
             })
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, TypeError, ValueError):
             return JsonResponse({
                 'success': False,
                 'message': '请求数据格式错误'
@@ -151,3 +173,122 @@ def delete_selected_pets(request):
         'success': False,
         'message': '请求方法错误！'
     }, status=405)
+
+
+def _parse_batch_operations(operations):
+    """校验批量操作参数，返回[(操作, 宠物ID, 数量)]；参数非法时抛出ValueError"""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('请提供要执行的操作')
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise ValueError(f'单次最多执行 {BATCH_MAX_OPERATIONS} 个操作')
+    parsed = []
+    for operation in operations:
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in BATCH_OPERATIONS:
+            raise ValueError(f'不支持的操作：{op}')
+        try:
+            pet_id = int(operation['pet_id'])
+            quantity = int(operation.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('宠物ID或数量格式错误')
+        if op == 'add' and quantity < 1:
+            raise ValueError('添加数量必须大于0')
+        parsed.append((op, pet_id, quantity))
+    return parsed
+
+
+def batch_update_cart(request):
+    """
+    批量修改购物车，请求体格式：
+    {"operations": [{"op": "add", "pet_id": 1, "quantity": 1},
+                    {"op": "set", "pet_id": 2, "quantity": 3},
+                    {"op": "remove", "pet_id": 3}]}
+    所有操作在一个事务中完成，按顺序合并后一次性批量写入
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': '请先登录！',
+            'login_required': True
+        }, status=401)
+
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'message': '请求方法错误！'
+        }, status=405)
+
+    try:
+        data = json.loads(request.body)
+        operations = _parse_batch_operations(data.get('operations'))
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'message': '请求数据格式错误'
+        }, status=400)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+
+    # 一次查询校验所有宠物是否存在
+    pet_ids = {pet_id for _, pet_id, _ in operations}
+    existing_ids = set(Pet.objects.filter(id__in=pet_ids).values_list('id', flat=True))
+    missing_ids = sorted(pet_ids - existing_ids)
+    if missing_ids:
+        return JsonResponse({
+            'success': False,
+            'message': '部分宠物不存在',
+            'missing_pet_ids': missing_ids
+        }, status=404)
+
+    with transaction.atomic():
+        # 锁定购物车行，同一用户的批量操作串行执行，读出的数量在事务内不会被其它批量操作改写
+        cart, created = Cart.objects.select_for_update().get_or_create(user_id=request.user.id)
+        items = {item.pet_id: item for item in CartItem.objects.filter(cart=cart, pet_id__in=pet_ids)}
+        # 按顺序在内存中合并操作，得到每只宠物的最终数量（0表示移出购物车）
+        quantities = {pet_id: item.quantity for pet_id, item in items.items()}
+        for op, pet_id, quantity in operations:
+            if op == 'add':
+                quantities[pet_id] = quantities.get(pet_id, 0) + quantity
+            elif op == 'set':
+                quantities[pet_id] = max(quantity, 0)
+            else:
+                quantities[pet_id] = 0
+
+        now = timezone.now()
+        to_create, to_update, to_delete = [], [], []
+        for pet_id, quantity in quantities.items():
+            item = items.get(pet_id)
+            if quantity <= 0:
+                if item:
+                    to_delete.append(pet_id)
+            elif item is None:
+                to_create.append(CartItem(cart=cart, pet_id=pet_id, quantity=quantity, created_at=now, updated_at=now))
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                item.updated_at = now
+                to_update.append(item)
+
+        # 加入购物车等未加锁的写入可能已并发插入同一宠物：以upsert写入，避免唯一约束冲突导致500
+        upsert_cart_items(to_create)
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_delete:
+            # 通过cart.items查询，删除信号中可直接拿到已缓存的cart，不会逐条查询
+            cart.items.filter(pet_id__in=to_delete).delete()
+        totals = cart.get_totals()
+
+    # 批量写入不会触发模型信号，需手动使购物车摘要缓存失效
+    transaction.on_commit(lambda: invalidate_cart_summary(request.user.id))
+    return JsonResponse({
+        'success': True,
+        'message': '购物车已更新',
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+        'item_count': totals['item_count'],
+        'total_price': totals['total_price']
+    })
+
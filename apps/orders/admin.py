@@ -1,5 +1,14 @@
-from django.contrib import admin
-from apps.orders.models import Order, OrderItem
+from django.contrib import admin, messages
+from apps.orders.export import XLSX_ADMIN_MAX_ORDERS, csv_response, xlsx_response
+from apps.orders.models import DailySales, Order, OrderItem, RouteEvent, Shipment
+
+class ShipmentInline(admin.StackedInline):
+    """发货时在订单页录入运单号，保存后自动注册顺丰路由推送"""
+    model = Shipment
+    extra = 0
+    can_delete = False
+    fields = ("mail_no", "last_op_code", "last_event_time", "is_delivered")
+    readonly_fields = ("last_op_code", "last_event_time", "is_delivered")
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -12,7 +21,7 @@ class OrderAdmin(admin.ModelAdmin):
         "created_time",
         "complete_time",
     )
-    list_filter = ("status", "created_time")
+    list_filter = ("status", "refund_required", "created_time")
     ordering = ("-created_time",)
     readonly_fields = ("created_time", "pay_time")  # 将创建时间设为只读
     fieldsets = (
@@ -20,7 +29,7 @@ class OrderAdmin(admin.ModelAdmin):
             "fields": ("order_number", "user", "status", "remark")
         }),
         ("金额信息", {
-            "fields": ("total_amount", "payment_method")
+            "fields": ("total_amount", "payment_method", "trade_no", "refund_required")
         }),
         ("时间信息", {
             "fields": ("created_time", "pay_time", "ship_time", "complete_time")  # 保留created_time在详情页显示
@@ -29,6 +38,28 @@ class OrderAdmin(admin.ModelAdmin):
             "fields": ("address",)
         }),
     )
+    actions = ("export_csv", "export_xlsx")
+    inlines = (ShipmentInline,)
+
+    @admin.action(description="导出所选订单（CSV）")
+    def export_csv(self, request, queryset):
+        return csv_response(queryset)
+
+    @admin.action(description="导出所选订单（Excel）")
+    def export_xlsx(self, request, queryset):
+        # xlsx需在请求内生成完整文件，订单过多时改用命令行导出，避免占满工作进程
+        if queryset.count() > XLSX_ADMIN_MAX_ORDERS:
+            self.message_user(
+                request,
+                f"所选订单超过{XLSX_ADMIN_MAX_ORDERS}个，请导出CSV，或在服务器上执行 "
+                f"python manage.py export_orders orders.xlsx（支持--status/--since/--until筛选）",
+                messages.WARNING,
+            )
+            return None
+        try:
+            return xlsx_response(queryset)
+        except RuntimeError as e:
+            self.message_user(request, str(e), messages.ERROR)
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -40,3 +71,40 @@ class OrderItemAdmin(admin.ModelAdmin):
         "total_price",
     )
     ordering = ("-order__created_time",)
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """每日销售汇总（只读，由订单状态变化增量维护，可用 rebuild_sales_rollups 重建）"""
+    list_display = ("day", "dimension", "value", "order_count", "units", "revenue")
+    list_filter = ("dimension", "value")
+    date_hierarchy = "day"
+    ordering = ("-day", "dimension", "value")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class RouteEventInline(admin.TabularInline):
+    """路由节点只追加，后台只读展示"""
+    model = RouteEvent
+    extra = 0
+    can_delete = False
+    fields = ("accept_time", "op_code", "accept_address", "remark")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(Shipment)
+class ShipmentAdmin(admin.ModelAdmin):
+    list_display = ("mail_no", "order", "last_op_code", "last_event_time", "is_delivered", "refreshed_at", "pushed_at")
+    list_filter = ("is_delivered",)
+    search_fields = ("mail_no", "order__order_number")
+    raw_id_fields = ("order",)
+    readonly_fields = ("last_op_code", "last_event_time", "is_delivered", "refreshed_at", "pushed_at", "created_time")
+    inlines = (RouteEventInline,)
@@ -0,0 +1,165 @@
+import base64
+import datetime
+import json
+import threading
+from functools import lru_cache
+from urllib.parse import quote_plus
+
+import requests
+from Crypto.Hash import SHA1, SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+from alipay.aop.api.constant.CommonConstants import PATTERN_RESPONSE_BEGIN, PATTERN_RESPONSE_SIGN_BEGIN
+from alipay.aop.api.constant.ParamConstants import COMMON_PARAM_KEYS
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# 默认网关为沙箱环境，生产环境通过 ALIPAY_SETTINGS['gateway'] 配置
+SANDBOX_GATEWAY = 'https://openapi-sandbox.dl.alipaydev.com/gateway.do'
+# 同时保持的网关长连接数
+POOL_MAXSIZE = 10
+
+_HASHES = {'RSA2': SHA256, 'RSA': SHA1}
+
+
+class AlipayError(Exception):
+    """支付宝网关请求或响应验签失败"""
+
+
+class AlipayClient:
+    """
+    进程级复用的支付宝客户端，兼容SDK的请求对象（AlipayTradePagePayRequest等）
+    与SDK的DefaultAlipayClient相比：密钥只在创建时解析一次，签名/验签不再重复解析PEM；
+    execute调用复用同一个HTTP连接池，避免每次请求都重新建立TLS连接
+    """
+
+    def __init__(self, app_id, private_key, alipay_public_key, gateway=SANDBOX_GATEWAY,
+                 sign_type='RSA2', charset='utf-8', timeout=15):
+        """
+        :param private_key: 应用私钥（PEM字符串或已解析的RsaKey）
+        :param alipay_public_key: 支付宝公钥（PEM字符串或已解析的RsaKey）
+        """
+        if sign_type not in _HASHES:
+            raise ValueError(f'不支持的签名类型：{sign_type}')
+        self.app_id = app_id
+        self.gateway = gateway
+        self.sign_type = sign_type
+        self.charset = charset
+        self.timeout = timeout
+        self._hash = _HASHES[sign_type]
+        self._signer = pkcs1_15.new(RSA.import_key(private_key) if isinstance(private_key, str) else private_key)
+        self._verifier = pkcs1_15.new(
+            RSA.import_key(alipay_public_key) if isinstance(alipay_public_key, str) else alipay_public_key
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session并非严格线程安全，每个线程各用一个，线程内的连接长期复用
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE))
+            session.headers['Content-Type'] = f'application/x-www-form-urlencoded;charset={self.charset}'
+            self._local.session = session
+        return session
+
+    def sign(self, content):
+        signature = self._signer.sign(self._hash.new(content.encode(self.charset)))
+        return base64.b64encode(signature).decode('ascii')
+
+    def verify(self, message, sign):
+        """验证支付宝签名，message为待验签的字节串"""
+        try:
+            self._verifier.verify(self._hash.new(message), base64.b64decode(sign))
+            return True
+        except (ValueError, TypeError):
+            return False
+
+    def verify_params(self, params):
+        """验证同步/异步通知参数的签名（不修改传入的字典）"""
+        sign = params.get('sign')
+        if not sign:
+            return False
+        content = '&'.join(
+            f'{key}={value}' for key, value in sorted(params.items()) if key not in ('sign', 'sign_type')
+        )
+        return self.verify(content.encode(self.charset), sign)
+
+    def _prepare(self, request):
+        """组装公共参数并签名，返回(公共参数, 业务参数)"""
+        params = request.get_params()
+        params['timestamp'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        common = {
+            'timestamp': params['timestamp'],
+            'app_id': self.app_id,
+            'method': params['method'],
+            'charset': self.charset,
+            'format': 'json',
+            'version': params['version'],
+            'sign_type': self.sign_type,
+        }
+        for key in ('app_auth_token', 'auth_token', 'notify_url', 'return_url'):
+            if params.get(key):
+                common[key] = params[key]
+        all_params = {**params, **common}
+        common['sign'] = self.sign('&'.join(
+            f'{key}={value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)}'
+            for key, value in sorted(all_params.items())
+        ))
+        return common, {key: value for key, value in params.items() if key not in COMMON_PARAM_KEYS}
+
+    def _url_encode(self, params):
+        return '&'.join(f'{key}={quote_plus(value, encoding=self.charset)}' for key, value in params.items())
+
+    def page_execute(self, request):
+        """生成电脑网站支付的跳转链接（GET方式）"""
+        common, params = self._prepare(request)
+        return f'{self.gateway}?{self._url_encode(common)}&{self._url_encode(params)}'
+
+    def execute(self, request):
+        """调用网关接口，验签后返回响应节点的JSON字符串"""
+        common, params = self._prepare(request)
+        try:
+            response = self.session.post(
+                f'{self.gateway}?{self._url_encode(common)}',
+                data=self._url_encode(params).encode(self.charset),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise AlipayError(f'请求支付宝网关失败：{e}') from e
+        return self._parse_response(response.content.decode(self.charset))
+
+    def _parse_response(self, body):
+        # 验签内容为响应节点的原始文本（不能先反序列化再序列化），sign取最后一个签名字段
+        begin = PATTERN_RESPONSE_BEGIN.search(body)
+        sign_match = None
+        for sign_match in PATTERN_RESPONSE_SIGN_BEGIN.finditer(body):
+            pass
+        if not begin or not sign_match:
+            raise AlipayError(f'支付宝响应格式错误：{body}')
+        content = body[begin.end() - 1:sign_match.start() + 1]
+        sign = body[sign_match.end():body.find('"', sign_match.end())]
+        if not self.verify(content.encode(self.charset), sign):
+            raise AlipayError(f'支付宝响应验签失败：{body}')
+        return content
+
+
+def _read_key(path):
+    with open(path, 'r') as f:
+        return RSA.import_key(f.read())
+
+
+@lru_cache(maxsize=None)
+def get_alipay_client():
+    """进程内共享的支付宝客户端：首次调用时读取并解析密钥，之后直接复用"""
+    config = settings.ALIPAY_SETTINGS
+    return AlipayClient(
+        app_id=config['appid'],
+        private_key=_read_key(config['app_private_key_path']),
+        alipay_public_key=_read_key(config['alipay_public_key_path']),
+        gateway=config.get('gateway', SANDBOX_GATEWAY),
+        sign_type=config.get('sign_type', 'RSA2'),
+        timeout=config.get('timeout', 15),
+    )
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Order
+from apps.orders.rollups import record_status_change
+
+UNPAID_STATUS = '待支付'
+CANCELLED_STATUS = '已取消'
+
+
+def unpaid_ttl():
+    return timedelta(minutes=getattr(settings, 'ORDER_UNPAID_TTL_MINUTES', 30))
+
+
+def unpaid_deadline(order):
+    """待支付订单的截止时间，超过后订单会被自动取消"""
+    return order.created_time + unpaid_ttl()
+
+
+def cancel_expired_orders(ttl=None, batch_size=500, pause=0.0, now=None):
+    """
+    取消创建时间早于 now - ttl 的待支付订单
+    每批在一个短事务中沿(status, created_time)索引锁定一小段订单，按id执行一条UPDATE并更新销售汇总，
+    每个事务只锁定本批行，不会长时间锁表；被锁定的订单不会在此期间被支付，汇总数据与状态保持一致
+    :param pause: 批次之间的停顿（秒），减轻主从复制延迟
+    :return: 取消的订单数
+    """
+    cutoff = (now or timezone.now()) - (ttl if ttl is not None else unpaid_ttl())
+    expired = Order.objects.filter(status=UNPAID_STATUS, created_time__lt=cutoff)
+    cancelled = 0
+    while True:
+        # 已处理的行会离开status=待支付的索引区间，每次从区间起点取下一批即可
+        with transaction.atomic():
+            ids = list(
+                expired.order_by('created_time', 'id').select_for_update().values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return cancelled
+            # UPDATE仍带status条件：不支持行锁的数据库（如SQLite）上，并发支付成功的订单不会被改回已取消
+            updated = Order.objects.filter(id__in=ids, status=UNPAID_STATUS).update(status=CANCELLED_STATUS)
+            cancelled += updated
+            if updated:
+                # 只把本次实际取消的订单计入汇总；全部更新成功时无需按状态再过滤
+                changed = Order.objects.filter(id__in=ids)
+                if updated != len(ids):
+                    changed = changed.filter(status=CANCELLED_STATUS)
+                record_status_change(changed, UNPAID_STATUS, CANCELLED_STATUS)
+        if len(ids) < batch_size:
+            return cancelled
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,134 @@
+import csv
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from apps.orders.models import Order
+
+# 导出列：(表头, 查询字段)；每个订单项一行，无订单项的订单也保留一行
+EXPORT_COLUMNS = (
+    ('订单编号', 'order_number'),
+    ('下单时间', 'created_time'),
+    ('订单状态', 'status'),
+    ('支付方式', 'payment_method'),
+    ('订单总金额', 'total_amount'),
+    ('支付时间', 'pay_time'),
+    ('支付交易号', 'trade_no'),
+    ('用户', 'user__email'),
+    ('收货人', 'address__recipient_name'),
+    ('联系电话', 'address__phone_number'),
+    ('省', 'address__province'),
+    ('市', 'address__city'),
+    ('区', 'address__district'),
+    ('详细地址', 'address__detail_address'),
+    ('宠物', 'items__pet__name'),
+    ('宠物类型', 'items__pet__species'),
+    ('购买单价', 'items__price'),
+    ('购买数量', 'items__count'),
+    ('小计', 'items__total_price'),
+)
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+EXPORT_FIELDS = [field for _, field in EXPORT_COLUMNS]
+EXPORT_CHUNK_SIZE = 2000
+# 后台直接导出xlsx的订单数上限：xlsx需在请求内写完整个文件，更多订单请使用 manage.py export_orders
+XLSX_ADMIN_MAX_ORDERS = 5000
+# 以这些字符开头的单元格会被Excel当作公式执行（CSV注入）
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# 导出展示名称而非存储值的字段
+_CHOICE_LABELS = {EXPORT_FIELDS.index('payment_method'): dict(Order.PAYMENT_METHOD)}
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        # 地址、姓名等为用户输入，加单引号前缀使Excel按文本显示而不执行公式
+        return "'" + value
+    return value
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    逐行产出导出数据，内存占用与导出总量无关
+    按订单id游标分批：每批先取chunk_size个订单id，再用一条关联查询取出这批订单的全部行并以iterator流式读取
+    （MySQL驱动会缓存整个结果集，分批可保证任何数据库上每次只持有一批数据）
+    """
+    queryset = queryset.order_by()
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        rows = (
+            Order.objects.filter(id__in=ids)
+            .order_by('id', 'items__id')
+            .values_list(*EXPORT_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        for row in rows:
+            row = [_format(value) for value in row]
+            for index, labels in _CHOICE_LABELS.items():
+                row[index] = labels.get(row[index], row[index])
+            yield row
+        last_id = ids[-1]
+
+
+class _Echo:
+    """csv.writer需要一个文件对象，这里直接返回写入的内容供StreamingHttpResponse逐块输出"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    # 带BOM，Excel打开中文不乱码
+    yield '\ufeff' + writer.writerow(EXPORT_HEADERS)
+    for row in export_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def write_csv(queryset, file, chunk_size=EXPORT_CHUNK_SIZE):
+    for line in iter_csv(queryset, chunk_size):
+        file.write(line)
+
+
+def write_xlsx(queryset, file, chunk_size=EXPORT_CHUNK_SIZE):
+    """以openpyxl只写模式生成xlsx：行数据直接写入临时文件，不在内存中保留整张表"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError('导出xlsx需要安装openpyxl：pip install openpyxl')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('订单')
+    sheet.append(EXPORT_HEADERS)
+    for row in export_rows(queryset, chunk_size):
+        sheet.append(row)
+    workbook.save(file)
+
+
+def _filename(ext):
+    return f'orders-{timezone.localtime().strftime("%Y%m%d%H%M%S")}.{ext}'
+
+
+def csv_response(queryset):
+    response = StreamingHttpResponse(iter_csv(queryset), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_filename("csv")}"'
+    return response
+
+
+def xlsx_response(queryset):
+    # xlsx为zip格式，需写完才能确定目录结构，先写入临时文件再以文件流返回
+    file = tempfile.TemporaryFile()
+    write_xlsx(queryset, file)
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=_filename('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+# “我的订单”中订单卡片的片段缓存：只缓存已完成的订单，其内容不会再变化
+ORDER_CARD_FRAGMENT = 'order_card'
+ORDER_CARD_TIMEOUT = 60 * 60 * 24
+CACHEABLE_ORDER_STATUSES = ('已完成',)
+
+
+def order_card_vary_on():
+    """卡片中展示的宠物年龄按月变化，缓存按月区分（订单id由模板传入）"""
+    return date.today().strftime('%Y-%m')
+
+
+def cached_order_card_ids(orders):
+    """
+    返回片段缓存已命中的订单id：这些卡片直接输出缓存内容，无需再预取订单项和宠物
+    缓存键与模板中{% cache order_card_timeout order_card order.id order.status order_card_month %}一致
+    """
+    month = order_card_vary_on()
+    keys = {
+        make_template_fragment_key(ORDER_CARD_FRAGMENT, [order.id, order.status, month]): order.id
+        for order in orders if order.status in CACHEABLE_ORDER_STATUSES
+    }
+    if not keys:
+        return set()
+    return {keys[key] for key in cache.get_many(list(keys))}
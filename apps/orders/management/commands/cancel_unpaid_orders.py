@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.expiry import UNPAID_STATUS, cancel_expired_orders, unpaid_ttl
+from apps.orders.models import Order
+
+
+class Command(BaseCommand):
+    help = '自动取消超时未支付的订单（可单次执行供定时任务调用，也可常驻运行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-minutes', type=int, default=None,
+                            help='待支付订单的有效期（分钟），默认取 ORDER_UNPAID_TTL_MINUTES')
+        parser.add_argument('--batch-size', type=int, default=500, help='每条UPDATE取消的订单数量')
+        parser.add_argument('--pause', type=float, default=0.05, help='批次之间的停顿（秒）')
+        parser.add_argument('--loop', action='store_true', help='常驻运行，每隔--interval秒扫描一次')
+        parser.add_argument('--interval', type=int, default=60, help='常驻运行时的扫描间隔（秒）')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要取消的订单数量，不做修改')
+
+    def handle(self, *args, **options):
+        ttl = timedelta(minutes=options['ttl_minutes']) if options['ttl_minutes'] is not None else unpaid_ttl()
+
+        if options['dry_run']:
+            count = Order.objects.filter(status=UNPAID_STATUS, created_time__lt=timezone.now() - ttl).count()
+            self.stdout.write(f'超时未支付的订单共 {count} 个')
+            return
+
+        while True:
+            cancelled = cancel_expired_orders(ttl=ttl, batch_size=options['batch_size'], pause=options['pause'])
+            if cancelled or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'已取消 {cancelled} 个超时未支付的订单'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,51 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.orders.export import EXPORT_CHUNK_SIZE, write_csv, write_xlsx
+from apps.orders.models import Order
+
+
+class Command(BaseCommand):
+    help = '导出订单（含订单项与收货地址）为CSV或Excel文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='输出文件路径')
+        parser.add_argument('--format', choices=('csv', 'xlsx'), default=None, help='导出格式，默认按文件扩展名判断')
+        parser.add_argument('--status', help='只导出指定状态的订单')
+        parser.add_argument('--since', help='下单日期起（含），格式YYYY-MM-DD')
+        parser.add_argument('--until', help='下单日期止（含），格式YYYY-MM-DD')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='每批读取的订单数量')
+
+    def _parse_date(self, value, option):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'{option} 日期格式错误：{value}')
+        return day
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('xlsx' if output.endswith('.xlsx') else 'csv')
+
+        queryset = Order.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['since']:
+            day = self._parse_date(options['since'], '--since')
+            queryset = queryset.filter(created_time__gte=timezone.make_aware(datetime.combine(day, time.min)))
+        if options['until']:
+            day = self._parse_date(options['until'], '--until')
+            queryset = queryset.filter(created_time__lte=timezone.make_aware(datetime.combine(day, time.max)))
+
+        if fmt == 'csv':
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                write_csv(queryset, f, options['chunk_size'])
+        else:
+            with open(output, 'wb') as f:
+                try:
+                    write_xlsx(queryset, f, options['chunk_size'])
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'订单已导出到 {output}'))
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from apps.orders.models import Order
+from apps.orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = '按日期范围分段重新计算每日销售汇总表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='开始日期（含），格式YYYY-MM-DD，默认为最早订单的日期')
+        parser.add_argument('--until', help='结束日期（含），格式YYYY-MM-DD，默认为今天')
+        parser.add_argument('--chunk-days', type=int, default=31, help='每段重新计算的天数（每段一个事务）')
+
+    def _parse_date(self, value, option):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'{option} 日期格式错误：{value}')
+
+    def handle(self, *args, **options):
+        until = self._parse_date(options['until'], '--until') if options['until'] else timezone.localdate()
+        if options['since']:
+            since = self._parse_date(options['since'], '--since')
+        else:
+            first = Order.objects.aggregate(first=Min('created_time'))['first']
+            if first is None:
+                self.stdout.write('没有订单，无需重建')
+                return
+            since = timezone.localtime(first).date()
+        if since > until:
+            raise CommandError('开始日期不能晚于结束日期')
+
+        rows = 0
+        start = since
+        while start <= until:
+            end = min(start + timedelta(days=options['chunk_days'] - 1), until)
+            rows += rebuild_rollups(start, end)
+            self.stdout.write(f'{start} ~ {end} 已重建')
+            start = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f'销售汇总重建完成，共 {rows} 行'))
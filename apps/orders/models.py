@@ -1,11 +1,10 @@
 # apps/orders/models.py
-from django.db import models
-from django.db.utils import IntegrityError
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from apps.pets.models import Pet
 from apps.users.models import Address
-import time
-import uuid
+from tools import snowflake
 
 User = get_user_model()
 
@@ -37,33 +36,45 @@ class Order(models.Model):
     remark = models.TextField(null=True, blank=True, verbose_name="订单备注")
     payment_method = models.CharField(max_length=16, choices=PAYMENT_METHOD, verbose_name="支付方式")
     trade_no = models.CharField(max_length=64, null=True, blank=True, verbose_name="支付交易号")
+    refund_required = models.BooleanField(default=False, verbose_name="待退款")  # 取消后才收到支付成功通知的订单
     def generate_order_number(self):
-        """生成唯一订单号：时间戳+随机字符串（确保唯一性）"""
-        timestamp = int(time.time() * 1000)  # 毫秒级时间戳，减少重复概率
-        random_str = str(uuid.uuid4().hex[:6]).upper()  # 6位随机字符串
-        return f"{timestamp}{random_str}"
+        """生成唯一订单号：Snowflake编号（时间戳+机器号+序列号），跨进程/主机不重复，且按时间递增"""
+        return str(snowflake.next_id())
 
     def save(self, *args, **kwargs):
-        # 仅在新建订单时生成订单号
+        # 仅在新建订单时生成订单号；编号本身不会冲突，无需捕获唯一性异常重试
         if not self.order_number:
-            # 处理并发下的唯一性冲突：如果生成的订单号已存在，重试生成
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries:
-                self.order_number = self.generate_order_number()
-                try:
-                    super().save(*args, **kwargs)
-                    return
-                except IntegrityError:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        raise  # 超过重试次数，抛出异常
-        else:
+            self.order_number = self.generate_order_number()
+        from apps.orders.rollups import record_new_orders, record_status_change
+        if self._state.adding:
             super().save(*args, **kwargs)
+            # 新订单（无论来自下单、后台还是脚本）在事务提交后计入每日销售汇总，
+            # 同一事务中随后写入的订单项（下单时的批量插入、后台的内联订单项）一并计入
+            pk = self.pk
+            transaction.on_commit(lambda: record_new_orders(Order.objects.filter(pk=pk)))
+            return
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" not in update_fields:
+            super().save(*args, **kwargs)
+            return
+        # 通过save修改状态（如后台发货、完成订单）时同步更新每日销售汇总：
+        # 旧状态取自加锁读出的数据库行而非内存中的实例，实例过期或并发修改时也不会漏记、重复计入
+        with transaction.atomic():
+            old_status = Order.objects.select_for_update().filter(pk=self.pk).values_list("status", flat=True).first()
+            super().save(*args, **kwargs)
+            if old_status is not None and old_status != self.status:
+                record_status_change(Order.objects.filter(pk=self.pk), old_status, self.status)
+
     class Meta:
         verbose_name = "订单表 Order"
         verbose_name_plural = verbose_name
         ordering = ["-created_time"]
+        indexes = [
+            # 我的订单按用户游标分页：WHERE user_id=? ORDER BY created_time DESC, id DESC
+            models.Index(fields=["user", "-created_time", "-id"], name="order_user_created_idx"),
+            # 超时未支付订单的范围扫描：WHERE status=? AND created_time<?
+            models.Index(fields=["status", "created_time"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
         return self.order_number
@@ -83,3 +94,92 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.order.order_number} - {self.pet.name}"
+
+
+class PaymentNotify(models.Model):
+    """已处理的支付宝异步通知（按notify_id去重，重复通知无需再次验签）"""
+    notify_id = models.CharField(max_length=64, unique=True, verbose_name="通知ID")
+    out_trade_no = models.CharField(max_length=32, verbose_name="商户订单号")
+    trade_status = models.CharField(max_length=32, verbose_name="交易状态")
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name="处理时间")
+
+    class Meta:
+        verbose_name = "支付通知记录 PaymentNotify"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return self.notify_id
+
+
+class DailySales(models.Model):
+    """
+    按天汇总的销售数据（增量维护，报表直接读取，无需扫描订单表）
+    species/payment_method维度只统计已支付（含已发货、已完成）的订单，status维度统计全部订单
+    """
+    DIMENSIONS = (
+        ("species", "宠物类型"),
+        ("payment_method", "支付方式"),
+        ("status", "订单状态"),
+    )
+    day = models.DateField(verbose_name="日期")
+    dimension = models.CharField(max_length=16, choices=DIMENSIONS, verbose_name="维度")
+    value = models.CharField(max_length=32, verbose_name="维度取值")
+    order_count = models.IntegerField(default=0, verbose_name="订单数")
+    units = models.IntegerField(default=0, verbose_name="销售数量")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="销售额")
+
+    class Meta:
+        verbose_name = "每日销售汇总 DailySales"
+        verbose_name_plural = verbose_name
+        unique_together = ("day", "dimension", "value")
+        ordering = ["-day", "dimension", "value"]
+
+    def __str__(self):
+        return f"{self.day} {self.dimension}={self.value}"
+
+
+class Shipment(models.Model):
+    """订单的顺丰运单（路由节点保存在RouteEvent中）"""
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="shipment", verbose_name="订单")
+    mail_no = models.CharField(max_length=32, unique=True, verbose_name="运单号")
+    last_op_code = models.CharField(max_length=8, blank=True, default="", verbose_name="最新操作码")
+    last_event_time = models.DateTimeField(null=True, blank=True, verbose_name="最新路由时间")
+    is_delivered = models.BooleanField(default=False, verbose_name="是否已签收")
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="最近同步时间")
+    pushed_at = models.DateTimeField(null=True, blank=True, verbose_name="最近推送时间")
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "运单 Shipment"
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return self.mail_no
+
+
+class RouteEvent(models.Model):
+    """运单路由节点（只追加，按(运单, 操作码, 时间)去重）"""
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name="events", verbose_name="运单")
+    op_code = models.CharField(max_length=8, verbose_name="操作码")
+    accept_time = models.DateTimeField(verbose_name="路由时间")
+    accept_address = models.CharField(max_length=255, blank=True, default="", verbose_name="路由地点")
+    remark = models.CharField(max_length=512, blank=True, default="", verbose_name="路由说明")
+    created_time = models.DateTimeField(auto_now_add=True, verbose_name="入库时间")
+
+    class Meta:
+        verbose_name = "路由节点 RouteEvent"
+        verbose_name_plural = verbose_name
+        ordering = ["accept_time", "id"]
+        unique_together = ("shipment", "op_code", "accept_time")
+
+    def __str__(self):
+        return f"{self.shipment_id} {self.op_code} {self.accept_time}"
+
+    def as_route(self):
+        """转换为与顺丰路由查询结果相同的结构，供模板使用"""
+        return {
+            "acceptTime": timezone.localtime(self.accept_time).strftime("%Y-%m-%d %H:%M:%S"),
+            "acceptAddress": self.accept_address,
+            "remark": self.remark,
+            "opCode": self.op_code,
+        }
@@ -0,0 +1,78 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.orders.models import Order, PaymentNotify
+from apps.orders.rollups import record_status_change
+
+logger = logging.getLogger(__name__)
+
+PAID_TRADE_STATUSES = ('TRADE_SUCCESS', 'TRADE_FINISHED')
+
+
+def is_notify_processed(notify_id):
+    """通知是否已处理过：只查唯一索引，远比RSA验签便宜"""
+    return bool(notify_id) and PaymentNotify.objects.filter(notify_id=notify_id).exists()
+
+
+def _parse_gmt(value):
+    """支付宝时间为北京时间的'YYYY-MM-DD HH:MM:SS'字符串"""
+    parsed = parse_datetime(value or '')
+    if parsed is None:
+        return timezone.now()
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def record_notify(notify_id, out_trade_no, trade_status):
+    if notify_id:
+        PaymentNotify.objects.bulk_create(
+            [PaymentNotify(notify_id=notify_id, out_trade_no=out_trade_no or '', trade_status=trade_status or '')],
+            ignore_conflicts=True,
+        )
+
+
+def _flag_for_refund(out_trade_no, status, params):
+    """
+    订单未支付就已被取消（如超时自动取消）却收到支付成功通知：钱已扣但订单不会发货
+    保留交易号并标记待退款，同时记错误日志，由人工在后台退款
+    """
+    Order.objects.filter(order_number=out_trade_no).update(
+        refund_required=True,
+        trade_no=params.get('trade_no'),
+        pay_time=_parse_gmt(params.get('gmt_payment')),
+    )
+    logger.error(
+        '订单%s状态为%s，收到支付成功通知（交易号%s，金额%s），已标记待退款',
+        out_trade_no, status, params.get('trade_no'), params.get('total_amount'),
+    )
+
+
+def apply_payment_notify(params):
+    """
+    处理已验签的支付成功通知：一条带条件的UPDATE完成状态流转
+    UPDATE ... WHERE order_number=? AND status='待支付'，并发重试时只有一条能更新成功
+    订单已被取消时不改变状态，标记为待退款并记错误日志；已支付、已发货、已完成的订单收到的通知视为重复通知
+    :return: 更新的订单数（0表示已处理过或订单已取消）；订单不存在时抛出Order.DoesNotExist
+    """
+    out_trade_no = params.get('out_trade_no')
+    with transaction.atomic():
+        updated = Order.objects.filter(order_number=out_trade_no, status='待支付').update(
+            status='已支付',
+            pay_time=_parse_gmt(params.get('gmt_payment')),
+            trade_no=params.get('trade_no'),
+        )
+        if updated:
+            record_status_change(Order.objects.filter(order_number=out_trade_no), '待支付', '已支付')
+        else:
+            row = Order.objects.filter(order_number=out_trade_no).values_list('status', 'refund_required').first()
+            if row is None:
+                raise Order.DoesNotExist(f'订单{out_trade_no}不存在')
+            status, refund_required = row
+            # 已支付/已发货/已完成的订单再收到通知（如交易结束时的TRADE_FINISHED）属于正常重复通知，直接视为成功
+            # 只有从未支付就被取消的订单才需要退款；同一笔交易的后续通知不再重复标记
+            if status == '已取消' and not refund_required:
+                _flag_for_refund(out_trade_no, status, params)
+        record_notify(params.get('notify_id'), out_trade_no, params.get('trade_status'))
+    return updated
@@ -0,0 +1,69 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from apps.pets.models import Pet
+
+# 运费规则：商品金额满199元包邮，否则收取15元运费
+FREE_SHIPPING_THRESHOLD = Decimal('199')
+SHIPPING_FEE = Decimal('15')
+CENT = Decimal('0.01')
+
+
+class PricingError(Exception):
+    """订单计价失败（商品不存在、数量非法等）"""
+
+    def __init__(self, message, missing_pet_ids=None):
+        super().__init__(message)
+        self.message = message
+        self.missing_pet_ids = missing_pet_ids or []
+
+
+class PricedLine:
+    """计价后的订单行"""
+
+    def __init__(self, pet, quantity, price):
+        self.pet = pet
+        self.quantity = quantity
+        self.price = price
+        self.total_price = (price * quantity).quantize(CENT, ROUND_HALF_UP)
+
+
+class PricedOrder:
+    """计价结果：订单行、商品金额、运费与应付总额"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.subtotal = sum((line.total_price for line in lines), Decimal('0'))
+        self.shipping_fee = Decimal('0') if self.subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_FEE
+        self.total_amount = self.subtotal + self.shipping_fee
+
+
+def price_order(items):
+    """
+    以数据库中的宠物价格为准计算订单金额，忽略客户端提交的价格
+    :param items: 客户端提交的商品列表，格式: [{pet_id, quantity, ...}]
+    :return: PricedOrder
+    """
+    if not items:
+        raise PricingError('订单中没有商品')
+    # 合并同一宠物的多行，并校验数量
+    quantities = {}
+    for item in items:
+        try:
+            pet_id = int(item['pet_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise PricingError('商品信息格式错误')
+        if quantity < 1:
+            raise PricingError('商品数量必须大于0')
+        quantities[pet_id] = quantities.get(pet_id, 0) + quantity
+
+    # 一次查询取出所有宠物
+    pets = Pet.objects.in_bulk(list(quantities))
+    missing = sorted(set(quantities) - set(pets))
+    if missing:
+        raise PricingError('部分商品不存在', missing_pet_ids=missing)
+
+    return PricedOrder([
+        PricedLine(pets[pet_id], quantity, Decimal(str(pets[pet_id].price)).quantize(CENT, ROUND_HALF_UP))
+        for pet_id, quantity in quantities.items()
+    ])
@@ -0,0 +1,116 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from apps.orders.models import DailySales, Order, OrderItem
+
+# 计入销售额的订单状态
+PAID_STATUSES = ('已支付', '已发货', '已完成')
+
+
+def _empty():
+    return [0, 0, Decimal('0')]
+
+
+def compute_contributions(orders, status=None):
+    """
+    计算一批订单对汇总表的贡献：{(日期, 维度, 取值): [订单数, 销售数量, 销售额]}
+    :param orders: 订单查询集（按订单创建时间的本地日期归档）
+    :param status: 这批订单所处的状态；为None时按各订单当前状态计算（全量重建使用）
+    """
+    result = defaultdict(_empty)
+    order_rows = (
+        orders.annotate(day=TruncDate('created_time'))
+        .values('day', 'payment_method', 'status')
+        .annotate(order_count=Count('id'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+    unit_rows = (
+        OrderItem.objects.filter(order__in=orders.values('id'))
+        .annotate(day=TruncDate('order__created_time'))
+        .values('day', 'order__payment_method', 'order__status')
+        .annotate(units=Sum('count'))
+        .order_by()
+    )
+    units = {
+        (row['day'], row['order__payment_method'], row['order__status']): row['units'] for row in unit_rows
+    }
+    for row in order_rows:
+        row_status = status or row['status']
+        totals = (row['order_count'], units.get((row['day'], row['payment_method'], row['status']), 0), row['revenue'])
+        keys = [(row['day'], 'status', row_status)]
+        if row_status in PAID_STATUSES:
+            keys.append((row['day'], 'payment_method', row['payment_method']))
+        for key in keys:
+            for i, value in enumerate(totals):
+                result[key][i] += value
+
+    # 按宠物类型：订单数为包含该类型宠物的订单数，销售额为对应订单项金额（不含运费）
+    species_rows = (
+        OrderItem.objects.filter(order__in=orders.values('id'))
+        .annotate(day=TruncDate('order__created_time'))
+        .values('day', 'pet__species', 'order__status')
+        .annotate(order_count=Count('order', distinct=True), units=Sum('count'), revenue=Sum('total_price'))
+        .order_by()
+    )
+    for row in species_rows:
+        if (status or row['order__status']) in PAID_STATUSES:
+            key = (row['day'], 'species', row['pet__species'])
+            for i, value in enumerate((row['order_count'], row['units'], row['revenue'])):
+                result[key][i] += value
+    return result
+
+
+def apply_deltas(deltas, sign=1):
+    """将增量累加到汇总表：先UPDATE ... SET x = x + ?，行不存在时再插入"""
+    for (day, dimension, value), (order_count, units, revenue) in deltas.items():
+        changes = {
+            'order_count': F('order_count') + sign * order_count,
+            'units': F('units') + sign * units,
+            'revenue': F('revenue') + sign * revenue,
+        }
+        lookup = {'day': day, 'dimension': dimension, 'value': value}
+        if DailySales.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailySales.objects.create(
+                    **lookup, order_count=sign * order_count, units=sign * units, revenue=sign * revenue
+                )
+        except IntegrityError:
+            # 并发插入了同一行，改为累加
+            DailySales.objects.filter(**lookup).update(**changes)
+
+
+def record_new_orders(orders):
+    """新订单（订单项已写入后）计入汇总，由Order.save在新建订单的事务提交后调用"""
+    with transaction.atomic():
+        apply_deltas(compute_contributions(orders))
+
+
+def record_status_change(orders, old_status, new_status):
+    """
+    订单状态变化后更新汇总：从旧状态扣减、计入新状态
+    须与状态UPDATE在同一事务中调用，orders为已变更状态的订单
+    """
+    if old_status == new_status:
+        return
+    with transaction.atomic():
+        apply_deltas(compute_contributions(orders, old_status), sign=-1)
+        apply_deltas(compute_contributions(orders, new_status))
+
+
+def rebuild_rollups(start, end):
+    """重新计算[start, end]日期范围内的汇总数据"""
+    orders = Order.objects.filter(created_time__date__gte=start, created_time__date__lte=end)
+    rows = [
+        DailySales(day=day, dimension=dimension, value=value, order_count=order_count, units=units, revenue=revenue)
+        for (day, dimension, value), (order_count, units, revenue) in compute_contributions(orders).items()
+    ]
+    with transaction.atomic():
+        DailySales.objects.filter(day__gte=start, day__lte=end).delete()
+        DailySales.objects.bulk_create(rows)
+    return len(rows)
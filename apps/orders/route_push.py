@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+
+from django.db import close_old_connections
+
+from apps.orders.shipping import apply_push_events, push_route_event
+
+logger = logging.getLogger(__name__)
+
+# 单次批量写入的最大节点数
+ROUTE_PUSH_MAX_BATCH = 1000
+# 推送请求等待写库结果的最长时间（秒），超时返回失败由顺丰重推
+ROUTE_PUSH_WAIT_TIMEOUT = 10
+
+
+class RouteEventBuffer:
+    """
+    路由推送的进程内缓冲区（组提交）
+    各请求线程把推送的节点放入缓冲区并等待，后台线程取出缓冲区中已有的全部推送立即合并写入；
+    写库期间到达的推送进入下一批。没有并发推送时不额外等待，并发越高每批合并的推送越多
+    写库成功后请求才返回成功，进程退出不会丢失已应答的推送
+    """
+
+    def __init__(self, max_batch=ROUTE_PUSH_MAX_BATCH):
+        self.max_batch = max_batch
+        self._condition = threading.Condition()
+        self._pending = []
+        self._pending_count = 0
+        self._thread = None
+
+    def submit(self, items):
+        """
+        放入一次推送的节点，返回Future，所在批次提交后结果为本次推送的节点数
+        :param items: push_route_event格式的(运单号, RouteEvent字段)列表
+        """
+        future = Future()
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sf-route-push', daemon=True)
+                self._thread.start()
+            self._pending.append((items, future))
+            self._pending_count += len(items)
+            self._condition.notify()
+        return future
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            # 不等待凑批：取出已排队的推送（至少一个，最多约max_batch个节点）立即写库
+            size, count = 0, 0
+            for items, _ in self._pending:
+                if size and count + len(items) > self.max_batch:
+                    break
+                size += 1
+                count += len(items)
+            batch, self._pending = self._pending[:size], self._pending[size:]
+            self._pending_count -= count
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            close_old_connections()
+            try:
+                stored, dropped = apply_push_events([item for items, _ in batch for item in items])
+            except Exception as e:
+                logger.exception('写入顺丰路由推送失败：%s个请求', len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                logger.debug('写入顺丰路由推送：%s个请求，%s个节点，丢弃%s个', len(batch), stored, dropped)
+                for items, future in batch:
+                    future.set_result(len(items))
+
+
+_buffer = RouteEventBuffer()
+
+
+def _reset_after_fork():
+    # 子进程中父进程的写库线程不存在，需重新创建缓冲区
+    global _buffer
+    _buffer = RouteEventBuffer()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def parse_route_push(msg_data):
+    """
+    解析推送的msgData：路由上传格式为节点数组，标准路由推送格式为{"WaybillRoute": [...]}或{"Body": {"WaybillRoute": [...]}}
+    :return: push_route_event格式的(运单号, RouteEvent字段)列表
+    :raises ValueError: 报文格式错误
+    """
+    data = json.loads(msg_data)
+    if isinstance(data, dict):
+        # 标准推送外层可能还有一层Body：{"Body": {"WaybillRoute": [...]}}
+        data = data.get('Body', data)
+        items = data.get('WaybillRoute') if isinstance(data, dict) else None
+    else:
+        items = data
+    # 没有路由列表的报文不能应答成功，否则顺丰不会重推，其中的节点就丢失了
+    if not isinstance(items, list):
+        raise ValueError('路由推送报文格式错误：缺少路由列表')
+    try:
+        return [push_route_event(item) for item in items]
+    except (KeyError, TypeError, AttributeError, ValueError, OverflowError) as e:
+        raise ValueError(f'路由推送报文格式错误：{e}') from e
+
+
+def ingest_route_push(items, timeout=ROUTE_PUSH_WAIT_TIMEOUT):
+    """
+    写入一次推送的路由节点，阻塞直到所在批次提交
+    :param items: push_route_event格式的(运单号, RouteEvent字段)列表
+    :return: 本次推送的节点数
+    """
+    if not items:
+        return 0
+    return _buffer.submit(items).result(timeout=timeout)
@@ -0,0 +1,312 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+from django.db.models import BooleanField, Case, CharField, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+from apps.orders.models import RouteEvent, Shipment
+from libs.sf_sdk import get_sf_client
+
+logger = logging.getLogger(__name__)
+
+# 详情页读取路由的缓存时间（秒），只用于挡住短时间内的重复刷新
+ROUTE_CACHE_TIMEOUT = 60
+# 距上次同步超过该时间才向顺丰重新查询
+ROUTE_STALE_AFTER = timedelta(minutes=10)
+# 收到过推送的运单由推送更新，查询只作为推送丢失时的兜底
+ROUTE_PUSH_STALE_AFTER = timedelta(hours=6)
+# 顺丰签收操作码，签收后路由不再变化，无需继续同步
+DELIVERED_OP_CODES = ('80', '8000')
+# 同一运单同时只允许一个后台同步任务，锁的超时需大于一次查询（含重试）的耗时
+REFRESH_LOCK_TIMEOUT = 60
+# 每条UPDATE语句最多更新的运单数，控制CASE表达式的长度
+SHIPMENT_UPDATE_BATCH_SIZE = 200
+
+# 后台同步线程池：详情页请求只负责提交任务，不等待顺丰接口返回
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='sf-route')
+
+
+def route_cache_key(order_id):
+    return f'orders:routes:{order_id}'
+
+
+def _refresh_lock_key(shipment_id):
+    return f'orders:route_refresh:{shipment_id}'
+
+
+def invalidate_routes(*order_ids):
+    cache.delete_many([route_cache_key(order_id) for order_id in order_ids])
+
+
+def _load_routes(order_id):
+    """从数据库组装详情页所需的路由数据"""
+    shipment = Shipment.objects.filter(order_id=order_id).first()
+    if shipment is None:
+        return {'shipment_id': None, 'routes': [], 'refreshed_at': None, 'pushed_at': None, 'is_delivered': False}
+    return {
+        'shipment_id': shipment.id,
+        'routes': [event.as_route() for event in shipment.events.all()],
+        'refreshed_at': shipment.refreshed_at,
+        'pushed_at': shipment.pushed_at,
+        'is_delivered': shipment.is_delivered,
+    }
+
+
+def is_stale(data, now=None):
+    """
+    路由是否需要向顺丰重新同步：已签收的运单不再同步
+    收到过推送的运单只在长时间没有任何更新时才查询兜底
+    """
+    if data['shipment_id'] is None or data['is_delivered']:
+        return False
+    now = now or timezone.now()
+    if data['pushed_at'] is not None:
+        updated_at = max(filter(None, (data['refreshed_at'], data['pushed_at'])))
+        return now - updated_at >= ROUTE_PUSH_STALE_AFTER
+    return data['refreshed_at'] is None or now - data['refreshed_at'] >= ROUTE_STALE_AFTER
+
+
+def get_routes(order):
+    """
+    读取订单的物流路由（按时间正序），先读缓存，未命中再查库
+    数据过期时提交后台同步任务，本次请求直接返回已有数据，不阻塞在顺丰接口上
+    """
+    key = route_cache_key(order.id)
+    data = cache.get(key)
+    if data is None:
+        data = _load_routes(order.id)
+        cache.set(key, data, ROUTE_CACHE_TIMEOUT)
+    if is_stale(data):
+        schedule_refresh(data['shipment_id'])
+    return data['routes']
+
+
+def schedule_refresh(shipment_id):
+    """提交后台同步任务，已有同步任务在执行时跳过"""
+    if not cache.add(_refresh_lock_key(shipment_id), 1, REFRESH_LOCK_TIMEOUT):
+        return False
+    _executor.submit(_refresh_in_background, shipment_id)
+    return True
+
+
+def _refresh_in_background(shipment_id):
+    close_old_connections()
+    try:
+        shipment = Shipment.objects.filter(id=shipment_id).first()
+        if shipment is not None and refresh_shipment(shipment) is not None:
+            cache.delete(_refresh_lock_key(shipment_id))
+        # 同步失败时保留锁直到超时，接口故障期间每个运单最多每REFRESH_LOCK_TIMEOUT秒重试一次
+    except Exception:
+        logger.exception('同步运单路由失败：shipment=%s', shipment_id)
+    finally:
+        # 线程池中的线程不经过请求周期，需手动关闭本线程的数据库连接
+        connections.close_all()
+
+
+def _api_result(result, mail_no, action):
+    """
+    取出顺丰接口返回中的业务结果apiResultData
+    :param action: 接口名称，用于日志
+    :return: 业务结果字典，请求或业务失败时返回None
+    """
+    if not result.get('success'):
+        logger.warning('%s请求失败：%s %s', action, mail_no, result.get('error'))
+        return None
+    data = json.loads(result['data'])
+    if data.get('apiResultCode') != 'A1000':
+        logger.warning('%s失败：%s %s %s', action, mail_no, data.get('apiResultCode'), data.get('apiErrorMsg'))
+        return None
+    api_result = data.get('apiResultData') or {}
+    if isinstance(api_result, str):
+        api_result = json.loads(api_result)
+    if not api_result.get('success'):
+        logger.warning('%s失败：%s %s %s', action, mail_no, api_result.get('errorCode'), api_result.get('errorMsg'))
+        return None
+    return api_result
+
+
+def parse_route_response(result, mail_no):
+    """
+    解析路由查询(EXP_RECE_SEARCH_ROUTES)的返回，取出指定运单的路由列表
+    :return: 路由列表，接口失败时返回None
+    """
+    api_result = _api_result(result, mail_no, '路由查询')
+    if api_result is None:
+        return None
+    for route_resp in (api_result.get('msgData') or {}).get('routeResps') or []:
+        if route_resp.get('mailNo') == mail_no:
+            return route_resp.get('routes') or []
+    return []
+
+
+def _parse_accept_time(value):
+    """顺丰路由时间为北京时间的'%Y-%m-%d %H:%M:%S'字符串"""
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d %H:%M:%S'))
+
+
+def route_event(route):
+    """将路由查询返回的一个节点转换为RouteEvent字段"""
+    return {
+        'op_code': str(route.get('opCode') or ''),
+        'accept_time': _parse_accept_time(route['acceptTime']),
+        'accept_address': route.get('acceptAddress') or '',
+        'remark': route.get('remark') or '',
+    }
+
+
+def _newer_than_last_event(shipment_id, accept_time):
+    return Q(id=shipment_id) & (Q(last_event_time__isnull=True) | Q(last_event_time__lt=accept_time))
+
+
+def write_route_events(shipments, events, refreshed=False, pushed=False):
+    """
+    批量追加写入路由节点，已存在的节点由唯一约束(运单, 操作码, 时间)忽略，不会修改或删除已有记录
+    并根据各运单的最新节点更新汇总状态，提交后使对应订单的详情页缓存失效
+    :param shipments: {运单ID: 订单ID}，本批涉及的运单
+    :param events: [(运单ID, route_event格式的字典)]
+    :param refreshed: 是否为主动同步，是则更新最近同步时间
+    :param pushed: 是否来自顺丰推送，是则更新最近推送时间
+    :return: 提交写入的节点数（含已存在而被忽略的节点）
+    """
+    latest = {}
+    delivered = set()
+    for shipment_id, event in events:
+        if shipment_id not in latest or event['accept_time'] > latest[shipment_id]['accept_time']:
+            latest[shipment_id] = event
+        if event['op_code'] in DELIVERED_OP_CODES:
+            delivered.add(shipment_id)
+
+    now = timezone.now()
+    shipment_ids = list(shipments)
+    with transaction.atomic():
+        RouteEvent.objects.bulk_create(
+            [RouteEvent(shipment_id=shipment_id, **event) for shipment_id, event in events],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        for start in range(0, len(shipment_ids), SHIPMENT_UPDATE_BATCH_SIZE):
+            chunk = shipment_ids[start:start + SHIPMENT_UPDATE_BATCH_SIZE]
+            changes = {}
+            if refreshed:
+                changes['refreshed_at'] = now
+            if pushed:
+                changes['pushed_at'] = now
+            chunk_delivered = [shipment_id for shipment_id in chunk if shipment_id in delivered]
+            if chunk_delivered:
+                changes['is_delivered'] = Case(
+                    When(id__in=chunk_delivered, then=Value(True)),
+                    default=F('is_delivered'), output_field=BooleanField(),
+                )
+            chunk_latest = [(shipment_id, latest[shipment_id]) for shipment_id in chunk if shipment_id in latest]
+            if chunk_latest:
+                # 条件更新：推送与查询可能乱序到达，只允许更新的节点覆盖汇总状态
+                # MySQL按书写顺序逐列赋值，last_op_code必须在last_event_time之前更新，其条件才会读到旧值
+                changes['last_op_code'] = Case(
+                    *[When(_newer_than_last_event(shipment_id, event['accept_time']), then=Value(event['op_code']))
+                      for shipment_id, event in chunk_latest],
+                    default=F('last_op_code'), output_field=CharField(),
+                )
+                changes['last_event_time'] = Case(
+                    *[When(_newer_than_last_event(shipment_id, event['accept_time']), then=Value(event['accept_time']))
+                      for shipment_id, event in chunk_latest],
+                    default=F('last_event_time'), output_field=DateTimeField(),
+                )
+            if changes:
+                Shipment.objects.filter(id__in=chunk).update(**changes)
+        order_ids = set(shipments.values())
+        transaction.on_commit(lambda: invalidate_routes(*order_ids))
+    return len(events)
+
+
+def store_route_events(shipment, events, refreshed=False):
+    """追加写入单个运单的路由节点，见write_route_events"""
+    return write_route_events(
+        {shipment.id: shipment.order_id},
+        [(shipment.id, event) for event in events],
+        refreshed=refreshed,
+    )
+
+
+def push_route_event(item):
+    """
+    将顺丰推送的一个路由节点转换为(运单号, RouteEvent字段)
+    兼容路由上传格式（waybillNo、毫秒时间戳barScanTm）与标准路由推送格式（mailno、acceptTime字符串）
+    """
+    mail_no = item.get('waybillNo') or item.get('mailno') or item.get('mailNo')
+    if 'barScanTm' in item:
+        accept_time = datetime.fromtimestamp(int(item['barScanTm']) / 1000, tz=timezone.get_current_timezone())
+    else:
+        accept_time = _parse_accept_time(item['acceptTime'])
+    return mail_no, {
+        'op_code': str(item.get('opCode') or ''),
+        'accept_time': accept_time,
+        'accept_address': item.get('acceptAddress') or item.get('zoneCode') or '',
+        'remark': item.get('remark') or '',
+    }
+
+
+def apply_push_events(parsed):
+    """
+    写入一批推送的路由节点：一次查询定位运单，一次批量插入，按运单分批条件更新汇总状态
+    非本站运单（或尚未建运单）的节点直接丢弃
+    :param parsed: push_route_event格式的(运单号, RouteEvent字段)列表
+    :return: (写入的节点数, 丢弃的节点数)
+    """
+    mail_nos = {mail_no for mail_no, _ in parsed if mail_no}
+    shipments = {
+        mail_no: (shipment_id, order_id)
+        for mail_no, shipment_id, order_id in Shipment.objects.filter(mail_no__in=mail_nos).values_list(
+            'mail_no', 'id', 'order_id')
+    }
+    events = [(shipments[mail_no][0], event) for mail_no, event in parsed if mail_no in shipments]
+    if not events:
+        return 0, len(parsed)
+    stored = write_route_events(
+        {shipment_id: order_id for shipment_id, order_id in shipments.values()}, events, pushed=True,
+    )
+    return stored, len(parsed) - len(events)
+
+
+def refresh_shipment(shipment, client=None):
+    """
+    向顺丰查询运单路由并追加写入
+    :return: 写入的节点数，接口失败时返回None
+    """
+    client = client or get_sf_client(**settings.SF_EXPRESS_SETTINGS)
+    routes = parse_route_response(client.query_route(shipment.mail_no), shipment.mail_no)
+    if routes is None:
+        return None
+    return store_route_events(shipment, [route_event(route) for route in routes], refreshed=True)
+
+
+def register_shipment(shipment, client=None):
+    """
+    向顺丰注册运单路由推送(EXP_RECE_REGISTER_ROUTE)，此后路由变化由推送写入
+    :return: 是否注册成功
+    """
+    client = client or get_sf_client(**settings.SF_EXPRESS_SETTINGS)
+    phone = Shipment.objects.filter(id=shipment.id).values_list('order__address__phone_number', flat=True).first()
+    result = client.register_route(shipment.mail_no, check_phone_no=(phone or '')[-4:])
+    return _api_result(result, shipment.mail_no, '路由注册') is not None
+
+
+def _register_in_background(shipment_id):
+    close_old_connections()
+    try:
+        shipment = Shipment.objects.filter(id=shipment_id).first()
+        if shipment is not None and register_shipment(shipment):
+            logger.info('运单已注册路由推送：%s', shipment.mail_no)
+    except Exception:
+        logger.exception('注册运单路由推送失败：shipment=%s', shipment_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_register(shipment_id):
+    """事务提交后在后台注册路由推送，不阻塞创建运单的请求"""
+    transaction.on_commit(lambda: _executor.submit(_register_in_background, shipment_id))
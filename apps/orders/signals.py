@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.orders.models import Shipment
+from apps.orders.shipping import schedule_register
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, created, **kwargs):
+    # 新建运单（后台录入运单号）后注册路由推送，否则顺丰推送会因找不到运单而被丢弃
+    if created:
+        schedule_register(instance.id)
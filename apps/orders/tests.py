@@ -1,3 +1,208 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from apps.orders.models import DailySales, Order
+from apps.orders.payments import apply_payment_notify
+from apps.orders.rollups import rebuild_rollups
+from apps.users.models import User
+from tools import snowflake
+
+# 压力测试规模：每个进程生成的编号数远超单毫秒序列号上限(4096)，覆盖序列号用尽后等待下一毫秒的分支
+STRESS_PROCESSES = 8
+STRESS_IDS_PER_PROCESS = 50000
+
+
+def _generate_ids(worker_id):
+    """子进程中按配置的机器号使用进程级生成器批量生成编号"""
+    os.environ['ORDER_NUMBER_WORKER_ID'] = str(worker_id)
+    return [snowflake.next_id() for _ in range(STRESS_IDS_PER_PROCESS)]
+
+
+def _generate_ids_inherited(_):
+    """子进程沿用父进程继承的配置（同一主机的工作进程共用一个基准机器号）"""
+    return [snowflake.next_id() for _ in range(STRESS_IDS_PER_PROCESS)]
+
+
+class SnowflakeTests(SimpleTestCase):
+    """Snowflake订单号生成器"""
+
+    def setUp(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        self.lock_dir = lock_dir.name
+        override = self.settings(ORDER_NUMBER_LOCK_DIR=self.lock_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_ids_are_increasing_and_parseable(self):
+        generator = snowflake.SnowflakeGenerator(worker_id=7)
+        ids = [generator.next_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        timestamp, worker_id, sequence = snowflake.parse_id(ids[-1])
+        self.assertEqual(worker_id, 7)
+        self.assertLessEqual(sequence, snowflake.SEQUENCE_MASK)
+
+    def test_threads_share_generator_without_duplicates(self):
+        generator = snowflake.SnowflakeGenerator(worker_id=1)
+        results = [[] for _ in range(8)]
+
+        def run(bucket):
+            bucket.extend(generator.next_id() for _ in range(5000))
+
+        threads = [threading.Thread(target=run, args=(bucket,)) for bucket in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [i for bucket in results for i in bucket]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_waits_for_small_clock_rollback(self):
+        generator = snowflake.SnowflakeGenerator(worker_id=2)
+        first = generator.next_id()
+        generator._last_ms += 5  # 模拟时钟回拨5毫秒
+        self.assertGreater(generator.next_id(), first)
+
+    def test_rejects_large_clock_rollback(self):
+        generator = snowflake.SnowflakeGenerator(worker_id=2)
+        generator.next_id()
+        generator._last_ms += snowflake.MAX_CLOCK_BACKWARD_MS + 1000
+        with self.assertRaises(snowflake.ClockMovedBackwards):
+            generator.next_id()
+
+    @unittest.skipIf(snowflake.fcntl is None, '需要flock')
+    def test_claim_worker_id_skips_slots_held_by_other_processes(self):
+        first, first_fd = snowflake.claim_worker_id(42, 2, self.lock_dir)
+        second, second_fd = snowflake.claim_worker_id(42, 2, self.lock_dir)
+        self.assertEqual((first, second), (42, 43))
+        with self.assertRaises(RuntimeError):
+            snowflake.claim_worker_id(42, 2, self.lock_dir)
+        # 释放后槽位可被重新占用
+        os.close(first_fd)
+        third, third_fd = snowflake.claim_worker_id(42, 2, self.lock_dir)
+        self.assertEqual(third, 42)
+        os.close(second_fd)
+        os.close(third_fd)
+
+    @unittest.skipIf(snowflake.fcntl is None, '需要flock')
+    def test_worker_id_from_config(self):
+        with self.settings(ORDER_NUMBER_WORKER_ID='42'):
+            self.assertEqual(snowflake.default_worker_id(), 42)
+        with self.settings(ORDER_NUMBER_WORKER_ID=4096):
+            with self.assertRaises(ValueError):
+                snowflake.default_worker_id()
+        with self.settings(ORDER_NUMBER_WORKER_ID=1020, ORDER_NUMBER_WORKER_SLOTS=64):
+            # 槽位范围截断到机器号上限
+            self.assertTrue(1020 <= snowflake.default_worker_id() <= snowflake.MAX_WORKER_ID)
+
+    def test_worker_id_falls_back_to_pid_without_flock(self):
+        with self.settings(ORDER_NUMBER_WORKER_ID=None), mock.patch.object(snowflake, 'fcntl', None):
+            self.assertEqual(snowflake.default_worker_id(), os.getpid() & snowflake.MAX_WORKER_ID)
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), '需要fork启动方式')
+    @unittest.skipIf(snowflake.fcntl is None, '需要flock')
+    def test_forked_workers_sharing_config_get_distinct_worker_ids(self):
+        # 与gunicorn/uwsgi相同：所有工作进程继承同一个ORDER_NUMBER_WORKER_ID
+        context = multiprocessing.get_context('fork')
+        with self.settings(ORDER_NUMBER_WORKER_ID='100'), context.Pool(STRESS_PROCESSES) as pool:
+            batches = pool.map(_generate_ids_inherited, range(STRESS_PROCESSES))
+        ids = [i for batch in batches for i in batch]
+        self.assertEqual(len(ids), len(set(ids)))
+        worker_ids = {snowflake.parse_id(i)[1] for i in ids}
+        self.assertTrue(all(100 <= worker_id < 100 + snowflake.DEFAULT_WORKER_SLOTS for worker_id in worker_ids))
+        self.assertGreater(len(worker_ids), 1)
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), '需要fork启动方式')
+    def test_multi_process_stress_unique(self):
+        context = multiprocessing.get_context('fork')
+        # 各进程的基准号间隔大于进程数，占用的都是各自基准号的第一个槽位
+        with self.settings(ORDER_NUMBER_WORKER_ID=None), context.Pool(STRESS_PROCESSES) as pool:
+            batches = pool.map(_generate_ids, [i * 100 for i in range(STRESS_PROCESSES)])
+        ids = [i for batch in batches for i in batch]
+        self.assertEqual(len(ids), STRESS_PROCESSES * STRESS_IDS_PER_PROCESS)
+        self.assertEqual(len(ids), len(set(ids)))
+        # 每个进程内严格递增，且机器号与配置一致
+        for index, batch in enumerate(batches):
+            self.assertEqual(batch, sorted(batch))
+            self.assertEqual({snowflake.parse_id(i)[1] for i in batch}, {index * 100})
+
+
+class OrderNumberTests(TestCase):
+
+    def test_save_assigns_unique_order_numbers(self):
+        user = User.objects.create(email='order@petpals.com')
+        orders = [
+            Order.objects.create(user=user, total_amount=100, payment_method='alipay')
+            for _ in range(50)
+        ]
+        numbers = [order.order_number for order in orders]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(numbers, sorted(numbers, key=int))
+        self.assertTrue(all(len(number) <= 32 for number in numbers))
+
+
+class PaymentNotifyTests(TestCase):
+    """支付宝异步通知处理"""
+
+    def setUp(self):
+        user = User.objects.create(email='notify@petpals.com')
+        self.order = Order.objects.create(user=user, total_amount=100, payment_method='alipay')
+
+    def notify(self, notify_id, trade_status):
+        return apply_payment_notify({
+            'notify_id': notify_id,
+            'out_trade_no': self.order.order_number,
+            'trade_no': '2026101822001',
+            'trade_status': trade_status,
+            'gmt_payment': '2026-10-18 12:00:00',
+            'total_amount': '100.00',
+        })
+
+    def test_trade_finished_after_shipping_is_not_flagged_for_refund(self):
+        self.assertEqual(self.notify('n1', 'TRADE_SUCCESS'), 1)
+        self.order.refresh_from_db()
+        self.order.status = '已发货'
+        self.order.save()
+        with self.assertNoLogs('apps.orders.payments', level='ERROR'):
+            self.assertEqual(self.notify('n2', 'TRADE_FINISHED'), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, '已发货')
+        self.assertFalse(self.order.refund_required)
+
+    def test_payment_for_cancelled_order_is_flagged_for_refund(self):
+        Order.objects.filter(pk=self.order.pk).update(status='已取消')
+        with self.assertLogs('apps.orders.payments', level='ERROR'):
+            self.assertEqual(self.notify('n1', 'TRADE_SUCCESS'), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, '已取消')
+        self.assertTrue(self.order.refund_required)
+        self.assertEqual(self.order.trade_no, '2026101822001')
+
+
+class DailySalesRollupTests(TestCase):
+    """每日销售汇总的增量维护"""
+
+    def rollups(self):
+        return sorted(DailySales.objects.values_list('day', 'dimension', 'value', 'order_count', 'units', 'revenue'))
+
+    def test_orders_created_outside_checkout_are_counted(self):
+        user = User.objects.create(email='rollup@petpals.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=user, total_amount=100, payment_method='alipay')
+        self.assertEqual(
+            list(DailySales.objects.filter(dimension='status').values_list('value', 'order_count')),
+            [('待支付', 1)],
+        )
+        order.status = '已取消'
+        order.save()
+        incremental = self.rollups()
+        self.assertTrue(all(row[3] >= 0 for row in incremental))
+        day = order.created_time.date()
+        rebuild_rollups(day, day)
+        self.assertEqual(incremental, self.rollups())
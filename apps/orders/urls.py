@@ -11,4 +11,5 @@ urlpatterns = [
     path('pay/result/', views.alipay_return, name='success'),
     path('alipay/notify/', views.alipay_notify, name="alipay_notify"),
     path('refund/<int:order_id>/', views.refund, name='refund'),
+    path('sf/route/push/', views.sf_route_push, name='sf_route_push'),
 ]
\ No newline at end of file
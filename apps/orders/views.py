@@ -1,23 +1,30 @@
 import json
 import logging
-from alipay.aop.api.AlipayClientConfig import AlipayClientConfig
-from alipay.aop.api.DefaultAlipayClient import DefaultAlipayClient
 from alipay.aop.api.domain.AlipayTradePagePayModel import AlipayTradePagePayModel
 from alipay.aop.api.domain.AlipayTradeRefundModel import AlipayTradeRefundModel
 from alipay.aop.api.request.AlipayTradePagePayRequest import AlipayTradePagePayRequest
 from alipay.aop.api.request.AlipayTradeRefundRequest import AlipayTradeRefundRequest
-from alipay.aop.api.util.SignatureUtils import verify_with_rsa
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from apps.cart.models import Cart, CartItem
+from apps.orders.alipay import get_alipay_client
+from apps.orders.expiry import unpaid_deadline
 from apps.orders.models import Order, OrderItem
+from apps.orders.payments import PAID_TRADE_STATUSES, apply_payment_notify, is_notify_processed, record_notify
+from apps.orders.pricing import PricingError, price_order
+from apps.orders.route_push import ingest_route_push, parse_route_push
+from apps.orders.shipping import get_routes
 from apps.pets.models import Pet
 from apps.users.models import Address
+from libs.sf_sdk import get_sf_client
 from petpals import settings
 
+logger = logging.getLogger(__name__)
+
 
 @login_required
 def checkout(request, pet_id=None):
@@ -32,7 +39,7 @@ def checkout(request, pet_id=None):
         selected_items = CartItem.objects.filter(
             cart=user_cart,
             pet_id__in=pet_ids  # 只保留用户购物车中存在的商品
-        )
+        ).select_related('pet')
         total_price = sum(item.get_total_price() for item in selected_items)
 
         # 获取用户地址
@@ -65,37 +72,47 @@ def checkout(request, pet_id=None):
 def order_create(request):
     if request.method == 'POST':
         # 解析请求体中的JSON数据
-        data = json.loads(request.body.decode('utf-8'))
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return JsonResponse({'success': False, 'message': '请求数据格式错误'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'message': '请求数据格式错误'}, status=400)
+        # 支付方式必须是订单支持的选项，payment_method字段不允许为空
+        payment_method = data.get('payment_method')
+        if payment_method not in dict(Order.PAYMENT_METHOD):
+            return JsonResponse({'success': False, 'message': '请选择有效的支付方式'}, status=400)
         # 获取收货地址
-        address = get_object_or_404(Address, id=data['address_id'], user=request.user)
-        # 计算订单总金额
-        total_amount = 0
-        for item in data['items']:
-            total_amount += float(item['price']) * int(item['quantity'])
-        # 检查是否包邮
-        if total_amount < 199:
-            total_amount += 15
-        # 创建订单
-        order = Order.objects.create(
-            user=request.user,
-            address=address,
-            total_amount=total_amount,
-            payment_method=data['payment_method'],
-            remark=data.get('remarks', '')
-        )
-        # 为每个商品创建订单项
-        for item_data in data['items']:
-            pet = get_object_or_404(Pet, id=item_data['pet_id'])
-            quantity = int(item_data['quantity'])
-            price = float(item_data['price'])
-
-            OrderItem.objects.create(
-                order=order,
-                pet=pet,
-                price=price,
-                count=quantity,
-                total_price=price * quantity
+        address = get_object_or_404(Address, id=data.get('address_id'), user=request.user)
+        # 以数据库价格计算订单金额（含包邮规则），不信任客户端提交的价格
+        try:
+            priced = price_order(data.get('items'))
+        except PricingError as e:
+            return JsonResponse({
+                'success': False,
+                'message': e.message,
+                'missing_pet_ids': e.missing_pet_ids,
+            }, status=400)
+
+        # 订单与订单项在同一事务中写入，订单项一次批量插入
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=request.user,
+                address=address,
+                total_amount=priced.total_amount,
+                payment_method=payment_method,
+                remark=data.get('remarks', '')
             )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    pet=line.pet,
+                    price=line.price,
+                    count=line.quantity,
+                    total_price=line.total_price
+                )
+                for line in priced.lines
+            ])
         return redirect('orders:pay', order_id=order.id)
     # 非POST请求返回错误
     return JsonResponse({'success': False, 'message': '无效的请求方法'})
@@ -112,18 +129,10 @@ def pay(request, order_id):
     # 如果订单不是待支付状态，不进行支付
     if order.status != '待支付':
         return JsonResponse({'success': False, 'message': '订单状态不正确'})
-
-
-    # 初始化客户端配置对象AlipayClientConfig
-    alipay_client_config = AlipayClientConfig()  # 初始化支付宝客户端配置对象
-    alipay_client_config.server_url = 'https://openapi-sandbox.dl.alipaydev.com/gateway.do'  # 沙箱环境
-    alipay_client_config.app_id = settings.ALIPAY_SETTINGS['appid']  # 应用ID
-    alipay_client_config.app_private_key = settings.ALIPAY_SETTINGS['app_private_key']  # 应用私钥
-    alipay_client_config.alipay_public_key = settings.ALIPAY_SETTINGS['alipay_public_key']  # 支付宝公钥
-    alipay_client_config.sign_type = settings.ALIPAY_SETTINGS['sign_type']  # 签名类型（默认RSA2）
-
-    # 创建客户端DefaultAlipayClient实例
-    alipay_client = DefaultAlipayClient(alipay_client_config)
+    # 超过支付有效期的订单即将被自动取消，不再发起支付
+    deadline = unpaid_deadline(order)
+    if deadline <= timezone.now():
+        return JsonResponse({'success': False, 'message': '订单已超时，请重新下单'})
 
     # 创建订单参数模型
     page_pay_model = AlipayTradePagePayModel()
@@ -131,6 +140,8 @@ def pay(request, order_id):
     page_pay_model.total_amount = "{0:.2f}".format(order.total_amount)  # 订单金额
     page_pay_model.subject = f"PetPals订单-{order.order_number}"  # 订单标题
     page_pay_model.product_code = "FAST_INSTANT_TRADE_PAY"  # 销售产品码
+    # 支付宝侧的交易截止时间与订单自动取消时间一致，避免订单取消后仍能付款
+    page_pay_model.time_expire = timezone.localtime(deadline).strftime("%Y-%m-%d %H:%M:%S")
 
     # 创建支付请求对象
     page_pay_request = AlipayTradePagePayRequest(biz_model=page_pay_model)  # 关联订单参数模型
@@ -138,8 +149,7 @@ def pay(request, order_id):
     page_pay_request.notify_url = settings.ALIPAY_SETTINGS["app_notify_url"]  # 异步通知地址（核心状态通知）
 
     # 生成支付链接，前端跳转支付页面
-    pay_url = alipay_client.page_execute(page_pay_request,
-                                         http_method='GET')  # 调用page_execute方法生成支付链接（http_method可选"GET"或"POST"）
+    pay_url = get_alipay_client().page_execute(page_pay_request)  # 复用进程级客户端，无需每次解析密钥
     return HttpResponse(f'<script>window.location.href="{pay_url}";</script>')  # 返回支付URL，前端跳转至支付宝支付页面
 
 
@@ -147,36 +157,12 @@ def pay(request, order_id):
 
 
 
-# 通知参数处理的工具函数
-def get_dic_sorted_params(org_dic_params):
-    content = ''
-    org_dic_params.pop('sign')
-    org_dic_params.pop('sign_type')  # 去除sign、sigh_type
-    new_list = sorted(org_dic_params, reverse=False)  # 待验签参数进行排序
-    for i in new_list:
-        p = i + '=' + org_dic_params.get(i) + '&'
-        content += p
-    sorted_params = content.strip('&')  # 重组字符串，将{k:v}形式的字典类型原始响应值--》转换成'k1=v1&k2=v2'形式的字符串格式
-    return sorted_params
-
-
 # 支付宝同步通知回调视图函数
 def alipay_return(request):
     # 获取支付宝返回的所有参数
     params = request.GET.dict()
-    # 提取签名
-    sign = params.get('sign')
-    # 对通知参数进行处理
-    org_message = get_dic_sorted_params(params)
-    # 转换成字节串
-    message = bytes(org_message, encoding='utf-8')
-
-    # 验证签名
-    verified = verify_with_rsa(
-        public_key=settings.ALIPAY_SETTINGS['alipay_public_key'],
-        message=message,
-        sign=sign,
-    )
+    # 验证签名（去除sign、sign_type后按参数名排序拼接）
+    verified = get_alipay_client().verify_params(params)
     if verified:
         # 验签成功且交易状态有效（仅用于前端展示）
         order_number = params.get("out_trade_no")  # 商户订单号
@@ -194,68 +180,35 @@ def alipay_notify(request):
     if request.method == 'POST':
         # 1. 获取支付宝发送的通知参数（POST形式）
         params = request.POST.dict()
-        # 2. 提取签名（用于验证）
-        sign = params.get('sign')
-        # 3. 对通知参数进行处理
-        org_message = get_dic_sorted_params(params)
-        # 4. 转换成字节串
-        message = bytes(org_message, encoding='utf-8')
-
-        # 5. verify_with_rsa方法验证签名
-        verified = verify_with_rsa(
-            public_key=settings.ALIPAY_SETTINGS['alipay_public_key'],
-            message=message,
-            sign=sign,
-        )
-
-        # 6. 检查验证状态
+        # 2. 重复通知（支付宝会多次重试）直接返回，跳过开销最大的验签
+        if is_notify_processed(params.get('notify_id')):
+            return HttpResponse("success")
+        # 3. 验证签名（去除sign、sign_type后按参数名排序拼接）
+        verified = get_alipay_client().verify_params(params)
         if not verified:
-            print("支付宝异步通知：签名验证失败")
+            logger.warning("支付宝异步通知：签名验证失败")
             return HttpResponse("fail")  # 签名验证失败返回fail，这是支付宝接口的硬性要求
 
         trade_status = params.get('trade_status')
-        if trade_status not in ['TRADE_SUCCESS', 'TRADE_FINISHED']:
-            logging.info(f"支付未成功，状态：{trade_status}")
+        if trade_status not in PAID_TRADE_STATUSES:
+            logger.info(f"支付未成功，状态：{trade_status}")
+            record_notify(params.get('notify_id'), params.get('out_trade_no'), trade_status)
             return HttpResponse("success")  # 支付宝要求非成功状态也返回success
-        # 7. 数据更新逻辑
+        # 4. 数据更新逻辑：单条条件UPDATE，受影响行数为0说明已处理过（幂等）
+        out_trade_no = params.get('out_trade_no')  # 订单号
         try:
-            # 获取支付数据
-            out_trade_no = params.get('out_trade_no')  # 订单号
-            gmt_create = params.get('gmt_create')  # 订单创建时间
-            gmt_payment = params.get('gmt_payment')  # 支付时间
-            trade_no = params.get('trade_no')  # 支付宝交易流水号
-            order = Order.objects.get(order_number=out_trade_no)
-
-            # 幂等性处理：如果已经支付成功，直接返回
-            if order.status == "已支付":
-                return HttpResponse("success")
-
-            order.pay_time = gmt_payment  # 写入支付时间
-            order.create_time = gmt_create  # 写入订单创建时间
-            order.status = "已支付"  # 更新订单状态
-            order.trade_no = trade_no  # 写入支付宝交易流水号
-            order.save()
-            logging.info(f"订单{out_trade_no}支付成功，状态已更新")
+            updated = apply_payment_notify(params)
         except Exception as e:
-            logging.error(f"处理订单失败：{str(e)}")
+            logger.error(f"处理订单失败：{str(e)}")
             return HttpResponse("fail")
+        if updated:
+            logger.info(f"订单{out_trade_no}支付成功，状态已更新")
         return HttpResponse("success")
     return HttpResponse("fail")  # 非POST请求返回fail
 
 def refund(request, order_id):
     order = get_object_or_404(Order, id=order_id)
 
-    # 初始化客户端配置对象AlipayClientConfig
-    alipay_client_config = AlipayClientConfig()  # 初始化支付宝客户端配置对象
-    alipay_client_config.server_url = 'https://openapi-sandbox.dl.alipaydev.com/gateway.do'  # 沙箱环境
-    alipay_client_config.app_id = settings.ALIPAY_SETTINGS['appid']  # 应用ID
-    alipay_client_config.app_private_key = settings.ALIPAY_SETTINGS['app_private_key']  # 应用私钥
-    alipay_client_config.alipay_public_key = settings.ALIPAY_SETTINGS['alipay_public_key']  # 支付宝公钥
-    alipay_client_config.sign_type = settings.ALIPAY_SETTINGS['sign_type']  # 签名类型（默认RSA2）
-
-    # 创建客户端DefaultAlipayClient实例
-    alipay_client = DefaultAlipayClient(alipay_client_config)
-
     # 实例化退款参数模型AlipayTradeRefundModel
     refund_model = AlipayTradeRefundModel()
     refund_model.out_trade_no = order.order_number  # 商户订单号
@@ -264,88 +217,37 @@ def refund(request, order_id):
 
     # 实例化退款请求类AlipayTradeRefundRequest
     refund_request = AlipayTradeRefundRequest(biz_model=refund_model)
-    refund_result = alipay_client.execute(refund_request)
+    refund_result = get_alipay_client().execute(refund_request)  # 复用连接池中的长连接
 
     return HttpResponse(refund_result)
 
 
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    from libs.sf_sdk import SFExpressSDK
-    sf_sdk = SFExpressSDK(
-        partner_id="YDO0OKA0",
-        checkword="cEF48gJFooF4wd8R7hesJEIV6aJgzRdq",
-        is_production=False
-    )
-    message = {
-      "success": True,
-      "data": {
-        "apiErrorMsg": "",
-        "apiResponseID": "00019A0B6061D04FDEC1EBBDFB37D94E",
-        "apiResultCode": "A1000",
-        "apiResultData": {
-          "success": True,
-          "errorCode": "S0000",
-          "errorMsg": None,
-          "msgData": {
-            "routeResps": [
-              {
-                "mailNo": "SF1234567890123",
-                "routes": [
-                  {
-                    "acceptAddress": "深圳市南山区科技园",
-                    "acceptTime": "2025-10-22 18:04:17",
-                    "remark": "顺丰速运 已收取快件（快递员：张明，电话：13800138000）",
-                    "opCode": "50"
-                  },
-                  {
-                    "acceptAddress": "深圳市转运中心",
-                    "acceptTime": "2025-10-22 20:30:52",
-                    "remark": "快件已到达 深圳市转运中心",
-                    "opCode": "30"
-                  },
-                  {
-                    "acceptAddress": "深圳市转运中心",
-                    "acceptTime": "2025-10-22 22:15:36",
-                    "remark": "快件正发往 广州市转运中心",
-                    "opCode": "40"
-                  },
-                  {
-                    "acceptAddress": "广州市转运中心",
-                    "acceptTime": "2025-10-23 06:48:21",
-                    "remark": "快件已到达 广州市转运中心",
-                    "opCode": "30"
-                  },
-                  {
-                    "acceptAddress": "广州市天河区网点",
-                    "acceptTime": "2025-10-23 09:20:10",
-                    "remark": "快件已到达 广州市天河区网点",
-                    "opCode": "30"
-                  },
-                  {
-                    "acceptAddress": "广州市天河区网点",
-                    "acceptTime": "2025-10-23 10:05:47",
-                    "remark": "快件正在派送中（派送员：李华，电话：13900139000）",
-                    "opCode": "80"
-                  },
-                  {
-                    "acceptAddress": "广州市天河区天河路XX号",
-                    "acceptTime": "2025-10-23 11:32:08",
-                    "remark": "快件已签收（签收人：王**，签收方式：本人签收）",
-                    "opCode": "90"
-                  }
-                ],
-                "orderId": "SF7444407228423",
-                "senderName": "陈先生",
-                "receiverName": "王先生",
-                "productType": "普通货物"
-              }
-            ]
-          }
-        }
-      }
-    }
-
-    routes = message["data"]["apiResultData"]["msgData"]["routeResps"][0]["routes"]
-    print(routes)
+    # 路由从本地运单表读取（带短期缓存），数据过期时由后台线程向顺丰同步，页面不等待接口返回
+    routes = get_routes(order)
     return render(request, "orders/order_detail.html", {"order": order, "routes": routes})
+
+
+@csrf_exempt    # 顺丰服务器推送，无CSRF令牌
+def sf_route_push(request):
+    """顺丰路由推送：验签后放入缓冲区，与同一时间窗口内的其它推送合并批量写库，写入成功后才应答成功"""
+    if request.method != 'POST':
+        return JsonResponse({"return_code": "1000", "return_msg": "仅支持POST请求"}, status=405)
+    msg_data = request.POST.get('msgData', '')
+    sf_sdk = get_sf_client(**settings.SF_EXPRESS_SETTINGS)
+    if not sf_sdk.verify_push(msg_data, request.POST.get('msgDigest', ''), request.POST.get('timestamp', '')):
+        logger.warning("顺丰路由推送：签名验证失败")
+        return JsonResponse({"return_code": "1000", "return_msg": "签名验证失败"})
+    try:
+        events = parse_route_push(msg_data)
+    except ValueError as e:
+        logger.warning(str(e))
+        return JsonResponse({"return_code": "1000", "return_msg": "报文格式错误"})
+    try:
+        ingest_route_push(events)
+    except Exception as e:
+        # 返回失败由顺丰重推，节点按唯一约束去重，重复写入无副作用
+        logger.error(f"顺丰路由推送写入失败：{str(e)}")
+        return JsonResponse({"return_code": "1000", "return_msg": "处理失败"})
+    return JsonResponse({"return_code": "0000", "return_msg": "成功"})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pets'
+
+    def ready(self):
+        # 注册信号处理函数
+        from apps.pets import signals  # noqa: F401
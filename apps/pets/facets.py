@@ -0,0 +1,175 @@
+import hashlib
+import json
+import time
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from apps.pets.models import Pet
+
+# 按字段取值分组的筛选项
+FIELD_FACETS = ('species', 'gender', 'is_fertile', 'tag')
+# 价格区间（元），上界不含
+PRICE_BUCKETS = {
+    '0-1000': (0, 1000),
+    '1000-3000': (1000, 3000),
+    '3000-5000': (3000, 5000),
+    '5000+': (5000, None),
+}
+# 年龄区间（月），上界不含
+AGE_BUCKETS = {
+    'baby': (0, 12),
+    'young': (12, 36),
+    'adult': (36, None),
+}
+FACETS = FIELD_FACETS + ('price', 'age')
+
+# 筛选栏展示顺序及文案：(分面, 标题, 全部选项文案)
+FACET_LABELS = (
+    ('species', '宠物类型', '全部类型'),
+    ('age', '年龄', '不限年龄'),
+    ('price', '价格范围', '不限价格'),
+    ('gender', '性别', '不限性别'),
+    ('is_fertile', '生育能力', '不限'),
+    ('tag', '标签', '全部标签'),
+)
+BUCKET_LABELS = {
+    'price': {
+        '0-1000': '1000元以下',
+        '1000-3000': '1000-3000元',
+        '3000-5000': '3000-5000元',
+        '5000+': '5000元以上',
+    },
+    'age': {
+        'baby': '幼年(0-1岁)',
+        'young': '青年(1-3岁)',
+        'adult': '成年(3岁以上)',
+    },
+}
+
+FACET_CACHE_TIMEOUT = 60 * 10
+FACET_VERSION_KEY = 'pet_facets:version'
+
+
+def parse_filters(params):
+    """从请求参数中取出合法的筛选条件，忽略未知或非法的取值"""
+    filters = {}
+    for facet in FIELD_FACETS:
+        value = params.get(facet, '').strip()
+        if value:
+            filters[facet] = value
+    if params.get('price') in PRICE_BUCKETS:
+        filters['price'] = params['price']
+    if params.get('age') in AGE_BUCKETS:
+        filters['age'] = params['age']
+    return filters
+
+
+def _month_start(month_index):
+    """月序号(year * 12 + month - 1)对应月份的第一天"""
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def age_range_q(min_months, max_months, today=None):
+    """
+    年龄（按月计，与calculate_pet_age口径一致）落在[min_months, max_months)内的条件
+    转换为birth_date的区间，可直接使用birth_date上的索引
+    """
+    today = today or date.today()
+    current = today.year * 12 + today.month - 1
+    # 年龄 >= m 个月 <=> 出生月份 <= 当前月份 - m <=> birth_date < (当前月份 - m + 1)月1日
+    q = Q(birth_date__lt=_month_start(current - min_months + 1))
+    if max_months is not None:
+        q &= Q(birth_date__gte=_month_start(current - max_months + 1))
+    return q
+
+
+def bucket_q(facet, value):
+    """单个筛选条件对应的查询条件"""
+    if facet == 'price':
+        low, high = PRICE_BUCKETS[value]
+        q = Q(price__gte=low)
+        return q & Q(price__lt=high) if high is not None else q
+    if facet == 'age':
+        return age_range_q(*AGE_BUCKETS[value])
+    return Q(**{facet: value})
+
+
+def filter_q(filters, exclude=None):
+    """组合所有筛选条件，exclude指定的筛选项不参与（用于计算该项自身的分面计数）"""
+    q = Q()
+    for facet, value in filters.items():
+        if facet != exclude:
+            q &= bucket_q(facet, value)
+    return q
+
+
+def _compute_facet_counts(filters):
+    counts = {'total': Pet.objects.filter(filter_q(filters)).count()}
+    # 每个分面的计数只应用其它分面的筛选条件，便于用户切换当前分面的取值
+    for facet in FIELD_FACETS:
+        rows = (
+            Pet.objects.filter(filter_q(filters, exclude=facet))
+            .exclude(**{f'{facet}__isnull': True})
+            .values_list(facet)
+            .annotate(count=Count('id'))
+            .order_by(facet)
+        )
+        counts[facet] = {value: count for value, count in rows if value != ''}
+    for facet, buckets in (('price', PRICE_BUCKETS), ('age', AGE_BUCKETS)):
+        counts[facet] = Pet.objects.filter(filter_q(filters, exclude=facet)).aggregate(**{
+            key: Count('id', filter=bucket_q(facet, key)) for key in buckets
+        })
+    return counts
+
+
+def facet_counts(filters):
+    """
+    返回当前筛选条件下的总数及各分面计数（带缓存）
+    缓存键包含版本号，Pet变化时递增版本号即可使所有组合失效
+    """
+    version = cache.get_or_set(FACET_VERSION_KEY, int(time.time()), None)
+    # 年龄区间依赖当天日期，一并计入缓存键；筛选值含中文，取摘要保证键合法
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f'pet_facets:{version}:{date.today().isoformat()}:{digest}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = _compute_facet_counts(filters)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_facet_counts():
+    """使所有分面计数缓存失效"""
+    try:
+        cache.incr(FACET_VERSION_KEY)
+    except ValueError:
+        # 版本号不存在（如缓存被清空）时用时间戳初始化，避免与旧版本号重复
+        cache.set(FACET_VERSION_KEY, int(time.time()), None)
+
+
+def build_facet_options(filters, counts):
+    """组装筛选栏所需的数据：每个分面的可选值、计数及是否选中"""
+    choices = {
+        'species': [value for value, _ in Pet.SPECIES_CHOICES],
+        'gender': [value for value, _ in Pet.GENDER_CHOICES],
+        'is_fertile': [value for value, _ in Pet.FERTILE_CHOICES],
+        'tag': sorted(counts['tag']),
+    }
+    facets = []
+    for facet, label, all_label in FACET_LABELS:
+        labels = BUCKET_LABELS.get(facet, {})
+        values = list(labels) if labels else choices[facet]
+        facets.append({
+            'name': facet,
+            'label': label,
+            'all_label': all_label,
+            'options': [{
+                'value': value,
+                'label': labels.get(value, value),
+                'count': counts[facet].get(value, 0),
+                'selected': filters.get(facet) == value,
+            } for value in values],
+        })
+    return facets
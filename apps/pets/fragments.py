@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+# 宠物详情页片段缓存（模板中{% cache %}使用的名称与过期时间）
+PET_DETAIL_FRAGMENT = 'pet_detail'
+PET_DETAIL_TIMEOUT = 60 * 60
+
+
+def pet_detail_vary_on(pet_id):
+    """详情页片段缓存的区分参数：年龄展示依赖当天日期，因此按天区分"""
+    return [pet_id, date.today().isoformat()]
+
+
+def invalidate_pet_detail(pet_id):
+    """删除宠物详情页的片段缓存"""
+    cache.delete(make_template_fragment_key(PET_DETAIL_FRAGMENT, pet_detail_vary_on(pet_id)))
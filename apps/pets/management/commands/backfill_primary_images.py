@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apps.pets.models import Pet, PetImage
+
+
+class Command(BaseCommand):
+    help = '回填宠物主图冗余字段 Pet.primary_image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批更新的宠物数量')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # 按(宠物, 是否主图, id)排序，每只宠物的第一行即为其主图
+        chosen = {}
+        images = PetImage.objects.order_by('pet_id', '-is_primary', 'id').values_list('pet_id', 'image')
+        for pet_id, image in images.iterator(chunk_size=batch_size):
+            chosen.setdefault(pet_id, image)
+
+        updated = 0
+        batch = []
+        for pet in Pet.objects.only('id', 'primary_image').iterator(chunk_size=batch_size):
+            image = chosen.get(pet.id, '')
+            if pet.primary_image.name != image:
+                pet.primary_image = image
+                batch.append(pet)
+            if len(batch) >= batch_size:
+                Pet.objects.bulk_update(batch, ['primary_image'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Pet.objects.bulk_update(batch, ['primary_image'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'主图回填完成，共更新 {updated} 只宠物'))
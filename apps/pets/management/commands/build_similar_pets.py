@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.pets.similar import build_index, update_index
+
+
+class Command(BaseCommand):
+    help = '构建/增量更新相似宠物推荐索引（建议通过定时任务周期执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='忽略已有索引，全量重建')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['full']:
+            version, full = build_index(), True
+        else:
+            version, full = update_index()
+        elapsed = time.perf_counter() - start
+        mode = '全量构建' if full else '增量更新'
+        self.stdout.write(self.style.SUCCESS(f'相似宠物索引{mode}完成，版本 {version}，耗时 {elapsed:.2f} 秒'))
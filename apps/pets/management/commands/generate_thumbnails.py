@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.pets.models import PetImage
+from apps.pets.thumbnails import generate_thumbnails
+
+
+def _init_worker():
+    # spawn方式启动的子进程需要重新初始化Django
+    django.setup()
+
+
+def _generate(image_name, force):
+    """子进程中执行：只读写文件存储，不访问数据库"""
+    return generate_thumbnails(image_name, force=force)
+
+
+class Command(BaseCommand):
+    help = '使用进程池并行（重新）生成宠物图片的WebP/JPEG缩略图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数量')
+        parser.add_argument('--force', action='store_true', help='覆盖已存在的缩略图')
+
+    def handle(self, *args, **options):
+        image_names = list(
+            PetImage.objects.exclude(image='').values_list('image', flat=True).distinct()
+        )
+        # fork子进程前关闭数据库连接，避免子进程继承同一连接
+        connections.close_all()
+
+        generated = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(_generate, name, options['force']): name
+                for name in image_names
+            }
+            for future in as_completed(futures):
+                try:
+                    generated += future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]} 生成失败：{e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'共处理 {len(image_names)} 张图片，生成 {generated} 个缩略图，失败 {failed} 张'
+        ))
+        if not failed and not getattr(settings, 'PET_THUMBNAILS_READY', False):
+            self.stdout.write('全部缩略图已生成，可设置 PET_THUMBNAILS_READY=1 跳过渲染时的存在性检查')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.pets.models import Pet, PetSearchToken
+from apps.pets.search import SEARCH_FIELDS, build_tokens
+
+
+class Command(BaseCommand):
+    help = '全量重建宠物搜索倒排索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的宠物数量')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        PetSearchToken.objects.all().delete()
+
+        total = 0
+        rows = []
+        pets = Pet.objects.only('id', *SEARCH_FIELDS).iterator(chunk_size=batch_size)
+        for pet in pets:
+            rows.extend(
+                PetSearchToken(pet_id=pet.id, token=token, weight=weight)
+                for token, weight in build_tokens(pet).items()
+            )
+            total += 1
+            if len(rows) >= batch_size * 50:
+                PetSearchToken.objects.bulk_create(rows, batch_size=1000)
+                rows = []
+        if rows:
+            PetSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'搜索索引重建完成，共索引 {total} 只宠物'))
@@ -2,6 +2,10 @@ import os
 from datetime import datetime
 
 from django.db import models
+from django.db.models import prefetch_related_objects
+
+from apps.pets.thumbnails import generate_thumbnails, thumbnail_srcsets
+from tools.pet_age import calculate_pet_age, format_age_months
 
 # Create your models here.
 
@@ -15,7 +19,7 @@ def pet_image_path(instance, filename):
     # 构建新的文件名：宠物类别-宠物名字-当前时间.扩展名
     new_filename = f"{instance.pet.species}-{instance.pet.name}-{current_time}.{ext}"
 
-    # 返回完整路径
+    # 返回完整路径（缩略图保存在同目录的thumbs/下，见apps.pets.thumbnails.thumbnail_name）
     return os.path.join('pets/', new_filename)
 
 class PetType(models.Model):
@@ -44,6 +48,17 @@ class PetImage(models.Model):
         verbose_name = "宠物图片表 PetImage"
         verbose_name_plural = "宠物图片表 PetImage"
 
+    def save(self, *args, **kwargs):
+        # 仅在上传了新文件时生成缩略图（保存前_committed为False）
+        is_new_file = bool(self.image) and not self.image._committed
+        super().save(*args, **kwargs)
+        if is_new_file:
+            generate_thumbnails(self.image.name, force=True)
+
+    def get_srcset(self):
+        """返回WebP与JPEG两种格式的srcset"""
+        return thumbnail_srcsets(self.image.name)
+
 class Pet(models.Model):
     SPECIES_CHOICES = [
         ('猫咪', '猫咪'),
@@ -90,11 +105,56 @@ class Pet(models.Model):
     price = models.FloatField(verbose_name='宠物价格(元)', null=False, blank=False)  # 宠物价格
     tag = models.CharField(max_length=5, verbose_name='宠物标签', null=True, blank=True)  # 宠物标签
     address = models.CharField(max_length=100, verbose_name='宠物地址', null=True, blank=True)  # 宠物地址
+    primary_image = models.ImageField(
+        upload_to='pets/',
+        max_length=255,
+        verbose_name='主图(冗余)',
+        blank=True,
+        default='',
+        editable=False,
+    )  # 主图路径冗余，由PetImage的信号维护，渲染卡片时无需再查询图片表
     created_at = models.DateTimeField(auto_now_add=True)  # 创建时间
     updated_at = models.DateTimeField(auto_now=True)  # 更新时间
 
+    def save(self, *args, **kwargs):
+        """
+        primary_image只由PetImage信号（及回填命令）以UPDATE直接维护，通过save更新宠物时从不回写该列，
+        避免读出后才上传图片的旧实例用旧值覆盖最新主图：
+        - 未指定update_fields时，更新除主图外的所有字段；
+        - 显式指定的update_fields中的primary_image同样被忽略；
+        - 更新已被删除的宠物会抛出DatabaseError（"did not affect any rows"），不会像默认行为那样重新插入
+        新建宠物（INSERT）不受影响
+        """
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'primary_image']
+        super().save(*args, **kwargs)
+
+    @property
+    def age(self):
+        """年龄展示字符串，查询时已用annotate_pet_age附加age_months则直接使用"""
+        age_months = getattr(self, 'age_months', None)
+        if age_months is not None:
+            return format_age_months(age_months)
+        return calculate_pet_age(self.birth_date)
+
+    def get_primary_srcset(self):
+        """返回主图WebP与JPEG两种格式的缩略图srcset"""
+        return thumbnail_srcsets(self.primary_image.name)
+
     # 添加方法获取主图
     def get_primary_image(self):
+        if self.primary_image:
+            return self.primary_image
+        # 已通过prefetch_related预取图片时直接在内存中挑选，不再发起查询
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            images = list(self.images.all())
+            for image in images:
+                if image.is_primary:
+                    return image.image
+            return images[0].image if images else None
         try:
             return self.images.filter(is_primary=True).first().image
         except:
@@ -104,4 +164,32 @@ class Pet(models.Model):
 
     class Meta:
         verbose_name = "宠物商品表 Pet"
-        verbose_name_plural = "宠物商品表 Pet"
\ No newline at end of file
+        verbose_name_plural = "宠物商品表 Pet"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='pet_created_id_idx'),  # 列表页游标分页
+        ]
+
+
+def prefetch_primary_images(pets):
+    """
+    为一批宠物准备主图：主图读取Pet.primary_image，未回填主图的宠物统一预取一次图片，
+    渲染时get_primary_image不再逐只查询
+    """
+    legacy_pets = [pet for pet in pets if not pet.primary_image]
+    if legacy_pets:
+        prefetch_related_objects(legacy_pets, 'images')
+
+
+class PetSearchToken(models.Model):
+    """宠物搜索倒排索引：每行为一只宠物包含的一个字符二元组"""
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='search_tokens', verbose_name='宠物')
+    token = models.CharField(max_length=2, verbose_name='索引词')
+    weight = models.PositiveIntegerField(default=1, verbose_name='权重')
+
+    class Meta:
+        verbose_name = "宠物搜索索引 PetSearchToken"
+        verbose_name_plural = "宠物搜索索引 PetSearchToken"
+        unique_together = ('pet', 'token')
+        indexes = [
+            models.Index(fields=['token', 'pet', 'weight'], name='pet_search_token_idx'),  # 按token检索的覆盖索引
+        ]
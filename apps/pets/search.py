@@ -0,0 +1,87 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum, Count
+
+from apps.pets.models import PetSearchToken
+
+# 参与索引的字段及其权重，名字/品种命中比描述命中更相关
+SEARCH_FIELDS = {
+    'name': 4,
+    'breed': 3,
+    'tag': 2,
+    'description': 1,
+}
+
+# 按非字母数字字符（空格、标点等）切分，中文字符属于\w
+_SPLIT_RE = re.compile(r'[\W_]+')
+
+
+def tokenize(text, unigrams=False):
+    """
+    将文本切分为字符二元组（bigram），无需中文分词器
+    例如 "布偶猫 幼猫" -> ["布偶", "偶猫", "幼猫"]；单个字符的片段保留为一元组
+    :param unigrams: 是否同时输出每个字符的一元组。建索引时开启，使"猫"、"狗"这类单字查询也能命中"布偶猫"；
+                     查询时不开启，多字查询仍只按二元组匹配
+    """
+    tokens = []
+    for run in _SPLIT_RE.split((text or '').lower()):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                tokens.extend(run)
+    return tokens
+
+
+def build_tokens(pet):
+    """计算宠物的倒排索引项：{token: 权重}"""
+    weights = Counter()
+    for field, weight in SEARCH_FIELDS.items():
+        for token in tokenize(getattr(pet, field), unigrams=True):
+            weights[token] += weight
+    return weights
+
+
+def index_pet(pet):
+    """增量更新单只宠物的索引：只写入变化的索引项"""
+    new_tokens = build_tokens(pet)
+    old_tokens = dict(PetSearchToken.objects.filter(pet=pet).values_list('token', 'weight'))
+
+    removed = [token for token in old_tokens if token not in new_tokens]
+    added = [
+        PetSearchToken(pet=pet, token=token, weight=weight)
+        for token, weight in new_tokens.items() if token not in old_tokens
+    ]
+    changed = {
+        token: weight for token, weight in new_tokens.items()
+        if token in old_tokens and old_tokens[token] != weight
+    }
+
+    with transaction.atomic():
+        if removed:
+            PetSearchToken.objects.filter(pet=pet, token__in=removed).delete()
+        if added:
+            PetSearchToken.objects.bulk_create(added)
+        for token, weight in changed.items():
+            PetSearchToken.objects.filter(pet=pet, token=token).update(weight=weight)
+
+
+def search_pet_ids(query, limit=20):
+    """
+    在倒排索引中检索，按相关度返回宠物id列表
+    排序依据：命中的不同token数量优先，其次为命中权重之和
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    rows = (
+        PetSearchToken.objects
+        .filter(token__in=tokens)
+        .values('pet_id')
+        .annotate(hits=Count('id'), score=Sum('weight'))
+        .order_by('-hits', '-score', '-pet_id')[:limit]
+    )
+    return [row['pet_id'] for row in rows]
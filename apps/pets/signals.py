@@ -0,0 +1,41 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.pets.facets import invalidate_facet_counts
+from apps.pets.fragments import invalidate_pet_detail
+from apps.pets.models import Pet, PetImage
+from apps.pets.search import SEARCH_FIELDS, index_pet
+
+
+def refresh_primary_image(pet_id):
+    """重新计算宠物的主图（主图优先，否则取第一张），写入Pet.primary_image"""
+    image = PetImage.objects.filter(pet_id=pet_id).order_by('-is_primary', 'id').values_list('image', flat=True).first()
+    # 使用update直接写单列，不触发Pet的save和updated_at变更
+    Pet.objects.filter(pk=pet_id).update(primary_image=image or '')
+
+
+@receiver(post_save, sender=PetImage)
+def pet_image_saved(sender, instance, **kwargs):
+    refresh_primary_image(instance.pet_id)
+    invalidate_pet_detail(instance.pet_id)
+
+
+@receiver(post_delete, sender=PetImage)
+def pet_image_deleted(sender, instance, **kwargs):
+    refresh_primary_image(instance.pet_id)
+    invalidate_pet_detail(instance.pet_id)
+
+
+@receiver(post_save, sender=Pet)
+def pet_saved(sender, instance, update_fields=None, **kwargs):
+    # 仅当参与索引的字段可能变化时才更新搜索索引
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+        index_pet(instance)
+    invalidate_facet_counts()
+    invalidate_pet_detail(instance.id)
+
+
+@receiver(post_delete, sender=Pet)
+def pet_deleted(sender, instance, **kwargs):
+    invalidate_facet_counts()
+    invalidate_pet_detail(instance.id)
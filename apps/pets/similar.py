@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from apps.pets.models import Pet
+from tools.pet_age import annotate_pet_age
+
+# 每只宠物预先计算并保存的近邻数量
+TOP_K = 8
+# 品种为自由文本，按哈希分桶后做独热编码
+BREED_BUCKETS = 32
+SPECIES = [value for value, _ in Pet.SPECIES_CHOICES]
+GENDERS = [value for value, _ in Pet.GENDER_CHOICES]
+# 各类特征的权重：同品种、同性别更相似；类别不同的宠物不互相推荐
+NUMERIC_WEIGHT = 1.0
+BREED_WEIGHT = 2.0
+GENDER_WEIGHT = 0.5
+# 全量计算距离时每批的行数，控制内存占用
+CHUNK_SIZE = 256
+# 变化的宠物超过该比例时直接全量重建
+FULL_REBUILD_RATIO = 0.2
+# 工作进程检查索引版本的间隔（秒）
+RELOAD_INTERVAL = 30
+
+_FILES = ('ids', 'species', 'features', 'neighbors', 'distances')
+
+
+def index_dir():
+    return Path(getattr(settings, 'SIMILAR_PETS_INDEX_DIR', settings.BASE_DIR / 'var' / 'similar_pets'))
+
+
+def _breed_bucket(breed):
+    """稳定的品种哈希（不受PYTHONHASHSEED影响）"""
+    digest = hashlib.md5((breed or '').strip().lower().encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % BREED_BUCKETS
+
+
+def _load_rows(queryset):
+    rows = (
+        annotate_pet_age(queryset)
+        .order_by('id')
+        .values_list('id', 'species', 'breed', 'gender', 'price', 'weight', 'age_months')
+    )
+    return list(rows)
+
+
+def _numeric(rows):
+    """数值特征：价格取对数压缩量级，体重，年龄（月）"""
+    return np.array(
+        [(np.log1p(max(price, 0)), weight, age_months) for _, _, _, _, price, weight, age_months in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), 3)
+
+
+def _encode(rows, mean, std):
+    """
+    将宠物编码为特征矩阵，返回(ids, 类别编码, 特征矩阵)
+    数值特征按全量构建时的均值/标准差标准化，保证增量更新时口径一致
+    """
+    n = len(rows)
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    species = np.array([SPECIES.index(row[1]) if row[1] in SPECIES else -1 for row in rows], dtype=np.int8)
+    features = np.zeros((n, 3 + BREED_BUCKETS + len(GENDERS)), dtype=np.float32)
+    if n:
+        features[:, :3] = (_numeric(rows) - mean) / std * NUMERIC_WEIGHT
+        for i, (_, _, breed, gender, _, _, _) in enumerate(rows):
+            features[i, 3 + _breed_bucket(breed)] = BREED_WEIGHT
+            if gender in GENDERS:
+                features[i, 3 + BREED_BUCKETS + GENDERS.index(gender)] = GENDER_WEIGHT
+    return ids, species, features
+
+
+def _squared_distances(a, b):
+    d = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2.0 * (a @ b.T)
+    return np.maximum(d, 0.0)
+
+
+def _top_k(features, ids, species, query_rows, k=TOP_K):
+    """
+    计算query_rows中每一行在同类别宠物中的k个近邻
+    :return: (近邻宠物id矩阵, 距离矩阵)，不足k个时以-1/inf补齐
+    """
+    neighbors = np.full((len(query_rows), k), -1, dtype=np.int64)
+    distances = np.full((len(query_rows), k), np.inf, dtype=np.float32)
+    query_rows = np.asarray(query_rows, dtype=np.int64)
+    for code in np.unique(species[query_rows]):
+        group = np.flatnonzero(species == code)
+        targets = features[group]
+        positions = np.flatnonzero(species[query_rows] == code)
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = positions[start:start + CHUNK_SIZE]
+            rows = query_rows[chunk]
+            d = _squared_distances(features[rows], targets)
+            d[group[None, :] == rows[:, None]] = np.inf  # 排除自身
+            m = min(k, len(group))
+            nearest = np.argpartition(d, m - 1, axis=1)[:, :m]
+            nearest_d = np.take_along_axis(d, nearest, axis=1)
+            order = np.argsort(nearest_d, axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            nearest_d = np.take_along_axis(nearest_d, order, axis=1)
+            found = np.where(np.isinf(nearest_d), -1, ids[group][nearest])
+            neighbors[chunk, :m] = found
+            distances[chunk, :m] = nearest_d
+    return neighbors, distances
+
+
+def _write_index(arrays, meta):
+    """写入新版本目录后再原子地切换CURRENT指针，读取方不会看到写了一半的索引"""
+    root = index_dir()
+    version = str(int(time.time() * 1000))
+    target = root / version
+    target.mkdir(parents=True, exist_ok=True)
+    for name in _FILES:
+        np.save(target / f'{name}.npy', arrays[name])
+    meta['version'] = version
+    (target / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+
+    pointer = root / 'CURRENT.tmp'
+    pointer.write_text(version, encoding='utf-8')
+    os.replace(pointer, root / 'CURRENT')
+
+    # 保留当前版本和上一个版本（可能仍被其它进程映射），清理更早的版本
+    versions = sorted((p for p in root.iterdir() if p.is_dir() and p.name.isdigit()), key=lambda p: int(p.name))
+    for old in versions[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+    return version
+
+
+def _read_index(mmap_mode=None):
+    root = index_dir()
+    try:
+        version = (root / 'CURRENT').read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    target = root / version
+    arrays = {name: np.load(target / f'{name}.npy', mmap_mode=mmap_mode) for name in _FILES}
+    arrays['meta'] = json.loads((target / 'meta.json').read_text(encoding='utf-8'))
+    return arrays
+
+
+def build_index():
+    """全量构建相似宠物索引"""
+    built_at = timezone.now()
+    rows = _load_rows(Pet.objects.all())
+    numeric = _numeric(rows)
+    mean = numeric.mean(axis=0) if len(rows) else np.zeros(3)
+    std = numeric.std(axis=0) if len(rows) else np.ones(3)
+    std[std == 0] = 1.0
+
+    ids, species, features = _encode(rows, mean, std)
+    neighbors, distances = _top_k(features, ids, species, np.arange(len(ids)))
+    return _write_index(
+        {'ids': ids, 'species': species, 'features': features, 'neighbors': neighbors, 'distances': distances},
+        {
+            'built_at': built_at.isoformat(),
+            'month': built_at.strftime('%Y-%m'),
+            'mean': mean.tolist(),
+            'std': std.tolist(),
+            'count': len(ids),
+        },
+    )
+
+
+def update_index():
+    """
+    增量更新索引：只重新编码自上次构建后新增/修改的宠物，并只重算受影响行的近邻
+    索引不存在、跨月（年龄整体变化）或变化过多时退化为全量构建
+    :return: (版本号, 是否全量构建)
+    """
+    current = _read_index()
+    started_at = timezone.now()
+    if current is None or current['meta']['month'] != started_at.strftime('%Y-%m'):
+        return build_index(), True
+
+    meta = current['meta']
+    built_at = datetime.fromisoformat(meta['built_at'])
+    old_ids = current['ids']
+
+    changed_rows = _load_rows(Pet.objects.filter(updated_at__gte=built_at))
+    alive_ids = np.fromiter(Pet.objects.values_list('id', flat=True), dtype=np.int64)
+    deleted = np.setdiff1d(old_ids, alive_ids)
+    changed = np.array([row[0] for row in changed_rows], dtype=np.int64)
+    if not len(changed) and not len(deleted):
+        return meta['version'], False
+    if len(changed) + len(deleted) > max(len(old_ids), 1) * FULL_REBUILD_RATIO:
+        return build_index(), True
+
+    # 删除已删除/已修改的行，追加重新编码的行，并保持按id排序
+    keep = ~np.isin(old_ids, np.concatenate([deleted, changed]))
+    new_ids, new_species, new_features = _encode(changed_rows, np.array(meta['mean']), np.array(meta['std']))
+    ids = np.concatenate([old_ids[keep], new_ids])
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    species = np.concatenate([current['species'][keep], new_species])[order]
+    features = np.concatenate([current['features'][keep], new_features])[order]
+    neighbors = np.concatenate([current['neighbors'][keep], np.full((len(new_ids), TOP_K), -1, dtype=np.int64)])[order]
+    distances = np.concatenate([current['distances'][keep], np.full((len(new_ids), TOP_K), np.inf, dtype=np.float32)])[order]
+
+    # 1. 修改过的行，以及近邻列表中包含已修改/已删除宠物的行：完整重算
+    stale = np.isin(ids, changed) | np.isin(neighbors, np.concatenate([deleted, changed])).any(axis=1)
+    stale_rows = np.flatnonzero(stale)
+    if len(stale_rows):
+        neighbors[stale_rows], distances[stale_rows] = _top_k(features, ids, species, stale_rows)
+
+    # 2. 其余行：只需判断新编码的宠物是否比现有第k近邻更近，合并进近邻列表
+    changed_rows_idx = np.flatnonzero(np.isin(ids, changed))
+    fresh_rows = np.flatnonzero(~stale)
+    for code in np.unique(species[changed_rows_idx]):
+        candidates = changed_rows_idx[species[changed_rows_idx] == code]
+        rows = fresh_rows[species[fresh_rows] == code]
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            d = _squared_distances(features[chunk], features[candidates]).astype(np.float32)
+            merged_d = np.hstack([distances[chunk], d])
+            merged_i = np.hstack([neighbors[chunk], np.broadcast_to(ids[candidates], d.shape)])
+            best = np.argsort(merged_d, axis=1)[:, :TOP_K]
+            distances[chunk] = np.take_along_axis(merged_d, best, axis=1)
+            neighbors[chunk] = np.where(
+                np.isinf(distances[chunk]), -1, np.take_along_axis(merged_i, best, axis=1)
+            )
+
+    meta.update({'built_at': started_at.isoformat(), 'count': len(ids)})
+    version = _write_index(
+        {'ids': ids, 'species': species, 'features': features, 'neighbors': neighbors, 'distances': distances},
+        meta,
+    )
+    return version, False
+
+
+class _SharedIndex:
+    """
+    进程内的只读索引句柄：以mmap方式打开，同一台机器上所有工作进程共享操作系统页缓存中的同一份数据
+    每隔RELOAD_INTERVAL秒检查一次CURRENT指针，发现新版本时切换
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arrays = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at > RELOAD_INTERVAL:
+            with self._lock:
+                if now - self._checked_at > RELOAD_INTERVAL:
+                    self._reload()
+                    self._checked_at = now
+        return self._arrays
+
+    def _reload(self):
+        try:
+            version = (index_dir() / 'CURRENT').read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            self._arrays, self._version = None, None
+            return
+        if version != self._version:
+            self._arrays = _read_index(mmap_mode='r')
+            self._version = self._arrays['meta']['version'] if self._arrays else None
+
+
+_shared_index = _SharedIndex()
+
+
+def similar_pet_ids(pet_id, k=4):
+    """查询与指定宠物最相似的k只宠物id（索引未构建或宠物不在索引中时返回空列表）"""
+    arrays = _shared_index.get()
+    if arrays is None:
+        return []
+    ids = arrays['ids']
+    row = int(np.searchsorted(ids, pet_id))
+    if row >= len(ids) or ids[row] != pet_id:
+        return []
+    return [int(pid) for pid in arrays['neighbors'][row, :k] if pid >= 0]
@@ -1,3 +1,60 @@
+from datetime import date
+
+from django.db import DatabaseError
 from django.test import TestCase
 
-# Create your tests here.
+from apps.pets.models import Pet, PetImage
+from apps.pets.search import search_pet_ids, tokenize
+
+
+def create_pet(**kwargs):
+    fields = dict(
+        species='猫咪', breed='中华田园猫', name='小花', birth_date=date(2024, 1, 1),
+        weight=3, gender='公', description='', price=100,
+    )
+    fields.update(kwargs)
+    return Pet.objects.create(**fields)
+
+
+class PetSearchTests(TestCase):
+
+    def test_index_contains_unigrams_but_query_uses_bigrams(self):
+        self.assertEqual(tokenize('布偶猫'), ['布偶', '偶猫'])
+        self.assertEqual(sorted(tokenize('布偶猫', unigrams=True)), sorted(['布偶', '偶猫', '布', '偶', '猫']))
+
+    def test_single_character_query(self):
+        ragdoll = create_pet(name='团团', breed='布偶猫')
+        husky = create_pet(species='狗狗', name='二哈', breed='哈士奇犬')
+        self.assertEqual(search_pet_ids('猫'), [ragdoll.id])
+        self.assertEqual(search_pet_ids('犬'), [husky.id])
+        self.assertEqual(search_pet_ids('布偶'), [ragdoll.id])
+
+
+class PetPrimaryImageTests(TestCase):
+    """主图冗余字段只由PetImage信号维护，旧实例保存时不会覆盖"""
+
+    def setUp(self):
+        self.pet = create_pet()
+
+    def test_stale_instance_does_not_overwrite_primary_image(self):
+        stale = Pet.objects.get(pk=self.pet.pk)
+        PetImage.objects.create(pet=self.pet, image='pets/new.jpg', is_primary=True)
+        stale.name = '改名'
+        stale.save()
+        pet = Pet.objects.get(pk=self.pet.pk)
+        self.assertEqual(pet.name, '改名')
+        self.assertEqual(pet.primary_image.name, 'pets/new.jpg')
+
+    def test_explicit_update_fields_skip_primary_image(self):
+        stale = Pet.objects.get(pk=self.pet.pk)
+        PetImage.objects.create(pet=self.pet, image='pets/new.jpg', is_primary=True)
+        stale.price = 200
+        stale.save(update_fields=['price', 'primary_image'])
+        pet = Pet.objects.get(pk=self.pet.pk)
+        self.assertEqual((pet.price, pet.primary_image.name), (200, 'pets/new.jpg'))
+
+    def test_saving_deleted_pet_raises(self):
+        stale = Pet.objects.get(pk=self.pet.pk)
+        Pet.objects.filter(pk=self.pet.pk).delete()
+        with self.assertRaises(DatabaseError):
+            stale.save()
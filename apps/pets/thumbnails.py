@@ -0,0 +1,85 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# 缩略图边长（像素），覆盖模板中80px~256px的展示框及其2倍屏
+THUMBNAIL_SIZES = (128, 256, 512)
+# 输出格式：扩展名 -> (Pillow格式名, 保存参数)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(image_name, size, ext):
+    """根据原图路径生成缩略图路径，如 pets/a.jpg -> pets/thumbs/a-256.webp"""
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'thumbs', f'{stem}-{size}.{ext}').replace('\\', '/')
+
+
+def has_thumbnails(image_name):
+    """
+    判断缩略图是否已生成
+    上传图片时同步生成缩略图，历史图片由 manage.py generate_thumbnails 回填，回填完成后（PET_THUMBNAILS_READY）
+    直接认为缩略图存在，渲染卡片时不再逐张访问存储（远程存储上每次都是一个HTTP请求）；
+    未回填时才以最小尺寸的webp是否存在为准
+    """
+    if not image_name:
+        return False
+    if getattr(settings, 'PET_THUMBNAILS_READY', False):
+        return True
+    return default_storage.exists(thumbnail_name(image_name, THUMBNAIL_SIZES[0], 'webp'))
+
+
+def generate_thumbnails(image_name, force=False):
+    """
+    为一张原图生成全部尺寸、全部格式的缩略图
+    :param image_name: 原图在存储中的路径
+    :param force: 是否覆盖已存在的缩略图
+    :return: 本次生成的缩略图数量
+    """
+    targets = [
+        (size, ext, thumbnail_name(image_name, size, ext))
+        for size in THUMBNAIL_SIZES
+        for ext in THUMBNAIL_FORMATS
+    ]
+    if not force:
+        targets = [target for target in targets if not default_storage.exists(target[2])]
+    if not targets:
+        return 0
+
+    with default_storage.open(image_name, 'rb') as f:
+        source = Image.open(f)
+        source = ImageOps.exif_transpose(source).convert('RGB')  # 按EXIF方向旋转，统一为RGB便于输出JPEG
+
+    for size, ext, name in targets:
+        # 居中裁剪为固定尺寸的正方形，与模板中object-cover的效果一致
+        thumb = ImageOps.fit(source, (size, size), Image.LANCZOS)
+        image_format, save_options = THUMBNAIL_FORMATS[ext]
+        buffer = BytesIO()
+        thumb.save(buffer, image_format, **save_options)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+    return len(targets)
+
+
+def thumbnail_srcsets(image_name):
+    """
+    生成可直接用于<img srcset>的字符串
+    :return: {'webp': ..., 'jpg': ...}，缩略图未生成时各项为空字符串
+    """
+    if not has_thumbnails(image_name):
+        return {ext: '' for ext in THUMBNAIL_FORMATS}
+    return {
+        ext: ', '.join(
+            f'{default_storage.url(thumbnail_name(image_name, size, ext))} {size}w'
+            for size in THUMBNAIL_SIZES
+        )
+        for ext in THUMBNAIL_FORMATS
+    }
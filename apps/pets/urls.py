@@ -5,4 +5,5 @@ app_name = 'pets'
 urlpatterns = [
     path('', views.pets, name='pets'),
     path('detail/<int:pet_id>/', views.detail, name='detail'),
+    path('search/', views.search, name='search'),
 ]
\ No newline at end of file
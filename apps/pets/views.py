@@ -1,6 +1,18 @@
+from urllib.parse import urlencode
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.functional import SimpleLazyObject
+from apps.pets.fragments import PET_DETAIL_TIMEOUT, pet_detail_vary_on
+from apps.pets.facets import parse_filters, filter_q, facet_counts, build_facet_options
 from apps.pets.models import Pet
-from tools.pet_age import calculate_pet_age
+from apps.pets.search import search_pet_ids
+from apps.pets.similar import similar_pet_ids
+from tools.pagination import keyset_paginate
+from tools.pet_age import annotate_pet_age
+
+PETS_PAGE_SIZE = 24  # 宠物列表每页数量
+SEARCH_LIMIT = 48  # 搜索结果最大数量
+SIMILAR_PETS_COUNT = 4  # 详情页相似宠物推荐数量
 
 
 def index(request):
@@ -8,20 +20,86 @@ def index(request):
     return render(request, 'index/index.html')
 
 def pets(request):
-    pets_list = Pet.objects.order_by('-created_at')
-    for pet in pets_list:
-        pet.age = calculate_pet_age(pet.birth_date)
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    # 服务端筛选：结果分页与分面计数在同一次请求中返回
+    filters = parse_filters(request.GET)
+    # 年龄由数据库计算（age_months），Pet.age直接格式化，无需逐个计算
+    queryset = annotate_pet_age(Pet.objects.filter(filter_q(filters)))
+    # 卡片主图读取Pet.primary_image冗余字段，无需再查询图片表
+    pets_list, next_cursor = keyset_paginate(queryset, request.GET.get('cursor'), PETS_PAGE_SIZE)
+    counts = facet_counts(filters)
+
+    if is_ajax:
+        return JsonResponse({
+            'success': True,
+            'count': counts['total'],
+            'next_cursor': next_cursor,
+            'facets': counts,
+            'results': [{
+                'id': pet.id,
+                'name': pet.name,
+                'species': pet.species,
+                'breed': pet.breed,
+                'gender': pet.gender,
+                'price': pet.price,
+                'age': pet.age,
+                'image': pet.primary_image.url if pet.primary_image else '',
+            } for pet in pets_list],
+        })
 
     return render(request, 'pets/pets.html', {
         'pets_list': pets_list,
-        'pets_count': pets_list.count(),
+        'pets_count': counts['total'],
+        'facets': build_facet_options(filters, counts),
+        'filter_query': urlencode(filters),
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
     })
 
+def search(request):
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    keyword = request.GET.get('q', '').strip()
+    # 通过倒排索引得到按相关度排序的id，再一次性取出宠物
+    pet_ids = search_pet_ids(keyword, limit=SEARCH_LIMIT)
+    pets_map = annotate_pet_age(Pet.objects.all()).in_bulk(pet_ids)
+    pets_list = [pets_map[pet_id] for pet_id in pet_ids if pet_id in pets_map]
+
+    if is_ajax:
+        return JsonResponse({
+            'success': True,
+            'keyword': keyword,
+            'results': [{
+                'id': pet.id,
+                'name': pet.name,
+                'species': pet.species,
+                'breed': pet.breed,
+                'price': pet.price,
+                'image': pet.primary_image.url if pet.primary_image else '',
+            } for pet in pets_list],
+        })
+
+    return render(request, 'pets/pets.html', {
+        'pets_list': pets_list,
+        'pets_count': len(pets_list),
+        'keyword': keyword,
+    })
+
+def load_similar_pets(pet_id):
+    """从相似宠物索引中取出推荐宠物（按相似度排序）"""
+    pet_ids = similar_pet_ids(pet_id, k=SIMILAR_PETS_COUNT)
+    pets_map = annotate_pet_age(Pet.objects.all()).in_bulk(pet_ids)
+    return [pets_map[similar_id] for similar_id in pet_ids if similar_id in pets_map]
+
 def detail(request, pet_id):
-    pet = get_object_or_404(Pet, id=pet_id)
-    pet.age = calculate_pet_age(pet.birth_date)
+    # 详情内容整体做片段缓存；命中时模板不会访问pet，只有未命中才查询宠物并一次性预取图片
+    pet = SimpleLazyObject(lambda: get_object_or_404(Pet.objects.prefetch_related('images'), id=pet_id))
+    # 相似推荐同样延迟到片段缓存未命中时才查询
+    similar_pets = SimpleLazyObject(lambda: load_similar_pets(pet_id))
     return render(request, 'pets/pet_detail.html', {
         'pet': pet,
+        'similar_pets': similar_pets,
+        'cache_timeout': PET_DETAIL_TIMEOUT,
+        'cache_vary_on': pet_detail_vary_on(pet_id),  # 与fragments.invalidate_pet_detail使用相同的区分参数
     })
 
 def test(request):
@@ -3,13 +3,21 @@ from urllib.parse import quote
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.hashers import check_password
+from django.db.models import Prefetch, prefetch_related_objects
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 import http.client
 
-from apps.orders.models import Order
+from apps.cart.guest import merge_guest_cart
+from apps.orders.fragments import (
+    CACHEABLE_ORDER_STATUSES, ORDER_CARD_TIMEOUT, cached_order_card_ids, order_card_vary_on,
+)
+from apps.orders.models import Order, OrderItem
+from apps.pets.models import prefetch_primary_images
 from apps.users.models import User, Address
-from tools.pet_age import calculate_pet_age
+from tools.pagination import keyset_paginate
+
+MY_ORDERS_PAGE_SIZE = 10  # 我的订单每页数量
 
 
 def user_profile(request):
@@ -25,20 +33,31 @@ def user_profile(request):
 
 def my_orders(request):
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
-    # 获取用户所有订单（按创建时间倒序）
-    orders = Order.objects.filter(user=request.user).order_by('-created_time')
-
-    for order in orders:
-        for item in order.items.all():
-            # 计算宠物年龄并添加到订单项对象上
-            item.pet_age = calculate_pet_age(item.pet.birth_date)
-
+    # 按创建时间倒序游标分页
+    orders_qs = Order.objects.filter(user=request.user).select_related('address')
+    orders, next_cursor = keyset_paginate(orders_qs, request.GET.get('cursor'), MY_ORDERS_PAGE_SIZE,
+                                          time_field='created_time')
+    # 片段缓存未命中的订单才需要渲染卡片：只为这些订单一次预取订单项→宠物，模板中不再逐项查询
+    cached_ids = cached_order_card_ids(orders)
+    rendered = [order for order in orders if order.id not in cached_ids]
+    prefetch_related_objects(rendered, Prefetch('items', queryset=OrderItem.objects.select_related('pet')))
+    prefetch_primary_images([item.pet for order in rendered for item in order.items.all()])
+
+    context = {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        # 已完成订单的卡片使用片段缓存
+        'cacheable_statuses': CACHEABLE_ORDER_STATUSES,
+        'order_card_timeout': ORDER_CARD_TIMEOUT,
+        'order_card_month': order_card_vary_on(),
+    }
     if is_ajax:
         # 返回局部模板（不含header/footer）
-        return render(request, 'users/partial/my_orders_partial.html', {'user': request.user, 'orders': orders})
+        return render(request, 'users/partial/my_orders_partial.html', {'user': request.user, **context})
     else:
         # 返回完整页面
-        return render(request, 'users/my_orders.html', {'orders': orders})
+        return render(request, 'users/my_orders.html', context)
 
 
 def shopping_cart(request):
@@ -117,7 +136,10 @@ def user_login(request):
         user = User.objects.filter(email=email).first()
         if user and check_password(password, user.password):
             login(request, user)
-            return JsonResponse({'success': True, 'redirect': '/', 'message': '登录成功'})
+            response = JsonResponse({'success': True, 'redirect': '/', 'message': '登录成功'})
+            # 将游客购物车合并到用户购物车
+            merge_guest_cart(request, response, user)
+            return response
         else:
             return JsonResponse({'success': False, 'message': '邮箱或密码错误'}, status=401)
     return render(request, 'users/login_register.html')
@@ -149,7 +171,10 @@ def user_register(request):
             user.save()
             # 登录用户
             login(request, user)
-            return JsonResponse({'success': True, 'redirect': '/', 'message': '注册成功！'})
+            response = JsonResponse({'success': True, 'redirect': '/', 'message': '注册成功！'})
+            # 将游客购物车合并到用户购物车
+            merge_guest_cart(request, response, user)
+            return response
         except Exception as e:
             # 捕获所有异常并返回错误信息
             return JsonResponse({'success': False, 'message': f'注册失败：{str(e)}'})
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import aiohttp
+
+from libs.sf_sdk import IDEMPOTENT_SERVICE_CODES, RETRY_STATUS_CODES, SFExpressSDK
+
+
+class RateLimiter:
+    """令牌桶限流：平均每秒最多rate次，允许瞬时突发burst次"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncSFExpressSDK(SFExpressSDK):
+    """
+    顺丰SDK的asyncio版本：签名与各接口的请求组装沿用SFExpressSDK，只替换发送请求的部分，
+    因此所有接口方法（如query_route）都返回协程，需要await
+    用法:
+        async with AsyncSFExpressSDK(partner_id, checkword, concurrency=50, rate_limit=100) as sdk:
+            results = await sdk.query_routes_bulk(tracking_numbers)
+    """
+
+    def __init__(self, partner_id="", checkword="", is_production=False, concurrency=20, rate_limit=None, **options):
+        """
+        :param concurrency: 同时进行中的请求数上限（同时也是连接池大小）
+        :param rate_limit: 每秒最多发起的请求数，None表示不限
+        :param options: 超时、重试等参数，同SFExpressSDK
+        """
+        super().__init__(partner_id, checkword, is_production, pool_maxsize=concurrency, **options)
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    def _session(self):
+        if self._http is None or self._http.closed:
+            connect_timeout, read_timeout = self.timeout
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            )
+        return self._http
+
+    async def _call_api(self, service_code, msg_data):
+        """通用API调用方法（异步），并发上限、限流与重试策略对所有接口生效"""
+        data = self._build_request(service_code, msg_data)
+        idempotent = service_code in IDEMPOTENT_SERVICE_CODES
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                if self._limiter:
+                    await self._limiter.acquire()
+                try:
+                    async with self._session().post(self.req_url, data=data) as response:
+                        text = await response.text()
+                        if idempotent and response.status in RETRY_STATUS_CODES and attempt < self.max_retries:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status
+                            )
+                        return {"success": True, "data": text}
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # 非查询类接口只在连接未建立（请求未发出）时重试
+                    retryable = idempotent or isinstance(e, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError))
+                    if not retryable or attempt >= self.max_retries:
+                        return {"success": False, "error": str(e) or e.__class__.__name__}
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+
+    async def query_routes_bulk(self, tracking_numbers, tracking_type=1, language="0", method_type="1"):
+        """
+        并发查询多个运单的路由
+        :param tracking_numbers: 跟踪号列表（运单号或订单号）
+        :return: {跟踪号: 与query_route相同格式的结果}
+        """
+        tracking_numbers = list(dict.fromkeys(tracking_numbers))
+        results = await asyncio.gather(*(
+            self.query_route(number, tracking_type=tracking_type, language=language, method_type=method_type)
+            for number in tracking_numbers
+        ))
+        return dict(zip(tracking_numbers, results))
@@ -0,0 +1,101 @@
+"""
+顺丰路由批量查询基准测试：在本地启动模拟网关（固定响应延迟），对比同步逐个查询与异步并发查询的耗时
+用法: python -m libs.sf_benchmark --count 500 --latency 0.05 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from libs.sf_async import AsyncSFExpressSDK
+from libs.sf_sdk import SFExpressSDK
+
+
+def _route_response(tracking_number):
+    return json.dumps({
+        "apiErrorMsg": "",
+        "apiResultCode": "A1000",
+        "apiResultData": json.dumps({
+            "success": True,
+            "errorCode": "S0000",
+            "msgData": {"routeResps": [{"mailNo": tracking_number, "routes": [
+                {"acceptAddress": "深圳市", "acceptTime": "2025-10-22 18:04:17", "remark": "顺丰速运 已收取快件", "opCode": "50"},
+            ]}]},
+        }, ensure_ascii=False),
+    }, ensure_ascii=False).encode("utf-8")
+
+
+def start_stub_server(latency):
+    """启动模拟顺丰网关，返回(服务器, 请求地址)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 响应头与响应体分两次写出，keep-alive连接上Nagle算法与对端延迟ACK叠加会使每个请求多等约40ms，
+        # 同步逐个查询的耗时将主要来自模拟网关而非SDK本身
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            form = urllib.parse.parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+            number = json.loads(form["msgData"][0])["trackingNumber"][0]
+            time.sleep(latency)
+            body = _route_response(number)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/std/service"
+
+
+def run_sync(url, numbers):
+    sdk = SFExpressSDK("bench", "checkword")
+    sdk.req_url = url
+    started = time.perf_counter()
+    results = [sdk.query_route(number) for number in numbers]
+    return time.perf_counter() - started, sum(r["success"] for r in results)
+
+
+async def run_async(url, numbers, concurrency, rate_limit):
+    async with AsyncSFExpressSDK("bench", "checkword", concurrency=concurrency, rate_limit=rate_limit) as sdk:
+        sdk.req_url = url
+        started = time.perf_counter()
+        results = await sdk.query_routes_bulk(numbers)
+        return time.perf_counter() - started, sum(r["success"] for r in results.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=500, help="查询的运单数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟网关每次响应的延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=50, help="异步客户端的并发上限")
+    parser.add_argument("--rate-limit", type=float, default=None, help="异步客户端每秒最多请求数")
+    parser.add_argument("--skip-sync", action="store_true", help="跳过同步逐个查询")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.latency)
+    numbers = [f"SF{1000000000000 + i}" for i in range(args.count)]
+    try:
+        if not args.skip_sync:
+            elapsed, ok = run_sync(url, numbers)
+            print(f"同步逐个查询: {ok}/{args.count} 成功, 耗时 {elapsed:.2f}s, {args.count / elapsed:.0f} 单/秒")
+        elapsed, ok = asyncio.run(run_async(url, numbers, args.concurrency, args.rate_limit))
+        print(f"异步并发查询(并发{args.concurrency}): {ok}/{args.count} 成功, 耗时 {elapsed:.2f}s, {args.count / elapsed:.0f} 单/秒")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,78 @@
+import random
+import threading
 import time
 import uuid
 import requests
 import hashlib
 import base64
+import hmac
 import urllib.parse
 import json
+from requests.adapters import HTTPAdapter
+
+# 查询类接口重复调用没有副作用，失败时可以安全重试
+IDEMPOTENT_SERVICE_CODES = frozenset({
+    "EXP_RECE_SEARCH_ROUTES",
+    "EXP_RECE_SEARCH_ORDER_RESP",
+    "EXP_RECE_QUERY_SFWAYBILL",
+    "EXP_EXCE_CHECK_PICKUP_TIME",
+    "EXP_RECE_VALIDATE_WAYBILLNO",
+    "EXP_RECE_SEARCH_PROMITM",
+})
+# 网关返回这些状态码时视为临时故障
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
 
 
 class SFExpressSDK:
-    def __init__(self, partner_id="", checkword="", is_production=False):
+    def __init__(self, partner_id="", checkword="", is_production=False, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_factor=0.5, pool_maxsize=10):
         """
         初始化顺丰SDK
         :param partner_id: 丰桥平台顾客编码
         :param checkword: 丰桥平台校验码
         :param is_production: 是否生产环境
+        :param connect_timeout: 建立连接超时（秒）
+        :param read_timeout: 读取响应超时（秒）
+        :param max_retries: 查询类接口失败后的最大重试次数
+        :param backoff_factor: 重试退避基数（秒），第n次重试前等待 backoff_factor * 2^(n-1) 秒并加随机抖动
+        :param pool_maxsize: 连接池保持的长连接数
         """
         self.partner_id = partner_id
         self.checkword = checkword
         self.is_production = is_production
         self.req_url = "https://sfapi.sf-express.com/std/service" if is_production else "https://sfapi-sbox.sf-express.com/std/service"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_maxsize = pool_maxsize
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """每个线程一个长连接会话，线程内复用连接池（keep-alive），不再每次请求都重新握手"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._local.session = session
+        return session
+
+    def _build_request(self, service_code, msg_data):
+        """组装带签名的请求参数"""
+        timestamp = str(int(time.time()))
+        return {
+            "partnerID": self.partner_id,
+            "requestID": str(uuid.uuid1()),
+            "serviceCode": service_code,
+            "timestamp": timestamp,
+            "msgDigest": self._generate_signature(msg_data, timestamp),
+            "msgData": msg_data
+        }
+
+    def _backoff(self, attempt):
+        return self.backoff_factor * (2 ** attempt) * (0.5 + random.random() / 2)
 
     def _generate_signature(self, msg_data, timestamp):
         """生成签名"""
@@ -28,26 +82,38 @@ class SFExpressSDK:
         md5_str = m.digest()
         return base64.b64encode(md5_str).decode('utf-8')
 
-    def _call_api(self, service_code, msg_data):
-        """通用API调用方法"""
-        request_id = str(uuid.uuid1())
-        timestamp = str(int(time.time()))
-        msg_digest = self._generate_signature(msg_data, timestamp)
-
-        data = {
-            "partnerID": self.partner_id,
-            "requestID": request_id,
-            "serviceCode": service_code,
-            "timestamp": timestamp,
-            "msgDigest": msg_digest,
-            "msgData": msg_data
-        }
+    def verify_push(self, msg_data, msg_digest, timestamp=""):
+        """
+        校验顺丰推送请求的签名，算法与请求签名相同（推送未携带timestamp时按空串计算）
+        :param msg_data: 推送的msgData原文
+        :param msg_digest: 推送的msgDigest
+        """
+        if not msg_data or not msg_digest:
+            return False
+        expected = self._generate_signature(msg_data, timestamp or "")
+        return hmac.compare_digest(expected.encode('utf-8'), msg_digest.encode('utf-8'))
 
-        try:
-            response = requests.post(self.req_url, data=data)
-            return {"success": True, "data": response.text}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+    def _call_api(self, service_code, msg_data):
+        """
+        通用API调用方法
+        查询类接口在连接失败、超时或网关临时错误时按指数退避重试；
+        其它接口只在连接未建立（请求未发出）时重试，避免重复下单等副作用
+        """
+        data = self._build_request(service_code, msg_data)
+        idempotent = service_code in IDEMPOTENT_SERVICE_CODES
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.req_url, data=data, timeout=self.timeout)
+                if idempotent and response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                return {"success": True, "data": response.text}
+            except requests.RequestException as e:
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt >= self.max_retries:
+                    return {"success": False, "error": str(e)}
+                time.sleep(self._backoff(attempt))
+                attempt += 1
 
     # 1. 创建订单 (EXP_RECE_CREATE_ORDER)
     def create_order(self, order_id, cargo_details, contact_info_list,
@@ -315,7 +381,27 @@ class SFExpressSDK:
         """
         return self._call_api("EXP_RECE_UPLOAD_ROUTE", json.dumps(route_list, ensure_ascii=False))
 
-    # 16. 预计派送时间查询 (EXP_RECE_SEARCH_PROMITM)
+    # 16. 路由注册 (EXP_RECE_REGISTER_ROUTE)
+    def register_route(self, attribute_no, attribute_type="1", check_phone_no="", order_id="",
+                       language="zh-CN", country="CN"):
+        """
+        路由注册：注册后顺丰会将该运单的路由变化推送到配置的推送地址
+        :param attribute_no: 运单号或订单号
+        :param attribute_type: 1-运单号，2-订单号
+        :param check_phone_no: 收/寄件人手机号后4位
+        :param order_id: 客户订单号
+        """
+        data = {
+            "attributeNo": attribute_no,
+            "type": str(attribute_type),
+            "checkPhoneNo": check_phone_no,
+            "orderId": order_id,
+            "language": language,
+            "country": country
+        }
+        return self._call_api("EXP_RECE_REGISTER_ROUTE", json.dumps(data, ensure_ascii=False))
+
+    # 17. 预计派送时间查询 (EXP_RECE_SEARCH_PROMITM)
     def search_promitm(self, search_no, check_type=2, check_nos=None):
         """
         预计派送时间查询
@@ -331,6 +417,25 @@ class SFExpressSDK:
         return self._call_api("EXP_RECE_SEARCH_PROMITM", json.dumps(data, ensure_ascii=False))
 
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_sf_client(partner_id, checkword, is_production=False, **options):
+    """
+    模块级客户端注册表：相同账号与环境复用同一个SDK实例（及其连接池）
+    :param options: 超时、重试等参数，仅在首次创建时生效
+    """
+    key = (partner_id, checkword, is_production)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = SFExpressSDK(partner_id, checkword, is_production, **options)
+    return client
+
+
 # 使用示例
 if __name__ == "__main__":
     # 初始化SDK
@@ -69,8 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'tools.context_processors.cart_item_count',
-                'tools.context_processors.cart_item_kind',
+                'tools.context_processors.cart_summary',
             ],
         },
     },
@@ -102,6 +101,16 @@ DATABASES = {
 }
 
 
+# 缓存配置（分面计数、详情页片段等依赖缓存，且由信号主动失效）
+# 多进程/多机部署时需改为Redis等共享缓存，否则信号只能清除当前进程的缓存
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'petpals',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -145,6 +154,25 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'  # 媒体文件的URL前缀
 MEDIA_ROOT = BASE_DIR / 'media'  # 媒体文件存储的物理路径
 
+# 相似宠物推荐索引（NumPy矩阵）存放目录，由 manage.py build_similar_pets 生成
+SIMILAR_PETS_INDEX_DIR = BASE_DIR / 'var' / 'similar_pets'
+
+# 宠物图片缩略图是否已全部生成：上传时同步生成，历史图片需先执行 manage.py generate_thumbnails 回填；
+# 默认逐张检查缩略图是否存在并在缺失时回退到原图；回填完成后设为1，渲染时不再检查缩略图文件
+PET_THUMBNAILS_READY = os.environ.get('PET_THUMBNAILS_READY', '0') == '1'
+
+# 订单号生成器的主机基准机器号（0-1023）：每个工作进程启动后在
+# [基准号, 基准号 + ORDER_NUMBER_WORKER_SLOTS) 中通过锁文件占用一个本机唯一的机器号，
+# 同一主机的多个工作进程共用该配置即可；多主机部署时每台主机配置不重叠的基准号（如 0、64、128……）
+ORDER_NUMBER_WORKER_ID = os.environ.get('ORDER_NUMBER_WORKER_ID')
+ORDER_NUMBER_WORKER_SLOTS = int(os.environ.get('ORDER_NUMBER_WORKER_SLOTS', 64))
+# 机器号锁文件目录：同一主机上所有会创建订单的进程（Web工作进程、管理命令、定时任务）必须使用同一目录，
+# 否则各自都能占用同一个机器号而生成重复的订单号。不要使用/tmp：systemd的PrivateTmp、容器中各进程的/tmp互不可见
+ORDER_NUMBER_LOCK_DIR = os.environ.get('ORDER_NUMBER_LOCK_DIR', str(BASE_DIR / 'var' / 'order_number_locks'))
+
+# 待支付订单的有效期（分钟），超时由 manage.py cancel_unpaid_orders 自动取消
+ORDER_UNPAID_TTL_MINUTES = 30
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -160,20 +188,17 @@ ALIPAY_SETTINGS = {
     "app_private_key_path": os.path.join(BASE_DIR, "keys/app_private_key.pem"),  # 应用私钥路径
     "alipay_public_key_path": os.path.join(BASE_DIR, "keys/alipay_public_key.pem"),  # 支付宝公钥路径
     "sign_type": "RSA2",  # 签名方式
+    "gateway": "https://openapi-sandbox.dl.alipaydev.com/gateway.do",  # 网关地址，生产环境为 https://openapi.alipay.com/gateway.do
+    "timeout": 15,  # 网关请求超时（秒）
     "debug": True,  # 沙箱环境为True
 }
 
-# 读取密钥内容
-from Crypto.PublicKey import RSA
-# 1. 读取应用私钥
-with open(ALIPAY_SETTINGS['app_private_key_path'], 'r') as f:
-    app_private_key_content = f.read()
-    private_key = RSA.import_key(app_private_key_content) # 主要是对文件内容进行处理，移除空格，换行，以及类似-----BEGIN PUBLIC KEY-----的样式
-    app_private_key = private_key.export_key().decode('utf-8')
-    ALIPAY_SETTINGS['app_private_key'] = app_private_key
-# 2. 读取支付宝公钥
-with open(ALIPAY_SETTINGS['alipay_public_key_path'], 'r') as f:
-    alipay_public_key_content = f.read()
-    public_key = RSA.import_key(alipay_public_key_content)
-    alipay_public_key = public_key.export_key().decode('utf-8')
-    ALIPAY_SETTINGS['alipay_public_key'] = alipay_public_key
\ No newline at end of file
+# 顺丰丰桥平台配置（沙箱）
+SF_EXPRESS_SETTINGS = {
+    "partner_id": "YDO0OKA0",  # 顾客编码
+    "checkword": "cEF48gJFooF4wd8R7hesJEIV6aJgzRdq",  # 校验码
+    "is_production": False,
+    "connect_timeout": 3.05,  # 建立连接超时（秒）
+    "read_timeout": 10,  # 读取响应超时（秒）
+    "max_retries": 2,  # 查询类接口的最大重试次数
+}
@@ -1,19 +1,11 @@
-from apps.cart.models import Cart
+from django.utils.functional import SimpleLazyObject
 
+from apps.cart.guest import guest_cart_summary
+from apps.cart.summary import get_cart_summary
 
-def cart_item_count(request):
-    count = 0
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            count = cart.get_item_count()
-    return {'cart_item_count': count}
 
-
-def cart_item_kind(request):
-    kind = 0
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            kind = cart.items.values('pet').distinct().count()
-    return {'cart_item_kind': kind}
\ No newline at end of file
+def cart_summary(request):
+    # 延迟计算：只有模板真正读取cart_summary时才查询（且优先读缓存）；游客直接读取签名Cookie
+    if not request.user.is_authenticated:
+        return {'cart_summary': SimpleLazyObject(lambda: guest_cart_summary(request))}
+    return {'cart_summary': SimpleLazyObject(lambda: get_cart_summary(request.user))}
@@ -0,0 +1,47 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk):
+    """将(时间, id)编码为分页游标字符串"""
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """解析分页游标，非法游标返回None（即从第一页开始）"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def keyset_paginate(queryset, cursor, page_size, time_field='created_at'):
+    """
+    基于(time_field, id)的游标分页（按时间倒序）
+    :param queryset: 待分页的查询集
+    :param cursor: 上一页返回的游标，为空表示第一页
+    :param page_size: 每页条数
+    :param time_field: 排序用的时间字段
+    :return: (当前页对象列表, 下一页游标或None)
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__lt': created_at}) | Q(**{time_field: created_at, 'id__lt': pk})
+        )
+    # 多取一条用于判断是否存在下一页，避免额外的count查询
+    items = list(queryset.order_by(f'-{time_field}', '-id')[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, time_field), last.id)
+    return items, next_cursor
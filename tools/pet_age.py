@@ -1,15 +1,31 @@
 from datetime import date
+from functools import lru_cache
 
-def calculate_pet_age(birth_date):
-    """计算宠物的年龄，返回格式化的年龄字符串"""
-    today = date.today()
-    # 计算年差
-    years = today.year - birth_date.year
-    # 计算月差，如果当前月份小于出生月份，则年减1
-    months = today.month - birth_date.month
-    if months < 0:
-        years -= 1
-        months += 12
+from django.db.models import ExpressionWrapper, F, IntegerField, Value
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def age_in_months(field='birth_date', today=None):
+    """
+    以数据库表达式计算宠物年龄（月），口径与calculate_pet_age一致：只比较年月
+    :param field: 出生日期字段，关联查询时可传如'pet__birth_date'
+    """
+    today = today or date.today()
+    return ExpressionWrapper(
+        Value(today.year * 12 + today.month) - (ExtractYear(F(field)) * 12 + ExtractMonth(F(field))),
+        output_field=IntegerField(),
+    )
+
+
+def annotate_pet_age(queryset, field='birth_date', name='age_months', today=None):
+    """为查询集附加年龄（月）字段，可直接用于filter/order_by，无需在Python中遍历"""
+    return queryset.annotate(**{name: age_in_months(field, today)})
+
+
+@lru_cache(maxsize=512)
+def format_age_months(months):
+    """将年龄（月）格式化为展示字符串"""
+    years, months = divmod(months, 12)
     # 如果宠物还不到1岁，只显示月份
     if years == 0:
         return f"{months}个月"
@@ -18,4 +34,15 @@ def calculate_pet_age(birth_date):
         return f"{years}岁{months}个月"
     # 否则只显示年
     else:
-        return f"{years}岁"
\ No newline at end of file
+        return f"{years}岁"
+
+
+@lru_cache(maxsize=4096)
+def _format_age(birth_year, birth_month, today):
+    return format_age_months((today.year - birth_year) * 12 + today.month - birth_month)
+
+
+def calculate_pet_age(birth_date, today=None):
+    """计算宠物的年龄，返回格式化的年龄字符串（按出生年月和当天日期缓存）"""
+    today = today or date.today()
+    return _format_age(birth_date.year, birth_date.month, today)
@@ -0,0 +1,159 @@
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Snowflake布局（共63位，保证为正数）：41位毫秒时间戳 | 10位机器号 | 12位序列号
+# 自定义纪元起41位毫秒时间戳可用约69年；单个进程每毫秒最多生成4096个编号
+EPOCH_MS = 1704038400000  # 2024-01-01 00:00:00 +08:00
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+# 时钟回拨在该范围内时等待追上，超过则报错，避免生成重复编号
+MAX_CLOCK_BACKWARD_MS = 50
+# 每台主机可同时运行的生成编号的进程数（机器号槽位数）
+DEFAULT_WORKER_SLOTS = 64
+
+
+class ClockMovedBackwards(Exception):
+    """系统时钟回拨过多，无法保证编号唯一"""
+
+
+def _config(name, default=None):
+    from django.conf import settings
+
+    value = getattr(settings, name, None)
+    if value in (None, ''):
+        value = os.environ.get(name)
+    return default if value in (None, '') else value
+
+
+def claim_worker_id(base, slots, lock_dir):
+    """
+    在[base, base + slots)中为当前进程占用一个本机唯一的机器号
+    每个机器号对应lock_dir下的一个锁文件，用flock非阻塞加锁，进程退出后锁自动释放，
+    因此同一主机上fork出的多个工作进程即使继承了相同的配置也会拿到不同的机器号
+    :return: (机器号, 持有锁的文件描述符)
+    """
+    if base < 0 or slots < 1 or base + slots - 1 > MAX_WORKER_ID:
+        raise ValueError(f'机器号范围 {base}-{base + slots - 1} 超出 0-{MAX_WORKER_ID}')
+    os.makedirs(lock_dir, exist_ok=True)
+    for worker_id in range(base, base + slots):
+        fd = os.open(os.path.join(lock_dir, f'order-number-worker-{worker_id}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        return worker_id, fd
+    raise RuntimeError(f'机器号 {base}-{base + slots - 1} 已全部被本机其它进程占用，请调大 ORDER_NUMBER_WORKER_SLOTS')
+
+
+_worker_lock_fd = None
+
+
+def default_worker_id():
+    """
+    机器号 = 主机基准号 ORDER_NUMBER_WORKER_ID（环境变量或settings，默认0）+ 本机进程槽位
+    槽位在进程首次生成编号时通过锁文件占用，同一主机的工作进程互不冲突；
+    多主机部署需为每台主机配置不重叠的基准号（如 0、64、128……，槽位数 ORDER_NUMBER_WORKER_SLOTS 默认64）
+    锁文件目录 ORDER_NUMBER_LOCK_DIR 须为本机所有创建订单的进程共享的路径（未配置时为系统临时目录，
+    PrivateTmp/容器下各进程的临时目录互不可见，会占用到相同的机器号）
+    不支持flock的平台退化为进程号的低10位
+    """
+    global _worker_lock_fd
+    base = int(_config('ORDER_NUMBER_WORKER_ID', 0))
+    slots = int(_config('ORDER_NUMBER_WORKER_SLOTS', DEFAULT_WORKER_SLOTS))
+    if not 0 <= base <= MAX_WORKER_ID:
+        raise ValueError(f'ORDER_NUMBER_WORKER_ID 必须在 0-{MAX_WORKER_ID} 之间')
+    if fcntl is None:
+        return os.getpid() & MAX_WORKER_ID
+    lock_dir = str(_config('ORDER_NUMBER_LOCK_DIR', tempfile.gettempdir()))
+    worker_id, _worker_lock_fd = claim_worker_id(base, min(slots, MAX_WORKER_ID + 1 - base), lock_dir)
+    return worker_id
+
+
+class SnowflakeGenerator:
+    """
+    进程内的Snowflake编号生成器：时间戳 + 机器号 + 序列号
+    机器号互不相同的进程之间生成的编号不会冲突，线程安全；同一毫秒内序列号用尽时等待下一毫秒
+    """
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id 必须在 0-{MAX_WORKER_ID} 之间')
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    @staticmethod
+    def _now_ms():
+        return time.time_ns() // 1_000_000 - EPOCH_MS
+
+    def _wait_until(self, target_ms):
+        now = self._now_ms()
+        while now < target_ms:
+            time.sleep(0.0001)
+            now = self._now_ms()
+        return now
+
+    def next_id(self):
+        with self._lock:
+            now = self._now_ms()
+            if now < self._last_ms:
+                if self._last_ms - now > MAX_CLOCK_BACKWARD_MS:
+                    raise ClockMovedBackwards(f'系统时钟回拨了 {self._last_ms - now} 毫秒')
+                now = self._wait_until(self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    now = self._wait_until(self._last_ms + 1)
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (WORKER_ID_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def parse_id(snowflake_id):
+    """拆解编号：(生成时间的毫秒时间戳, 机器号, 序列号)"""
+    return (
+        (snowflake_id >> (WORKER_ID_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        (snowflake_id >> SEQUENCE_BITS) & MAX_WORKER_ID,
+        snowflake_id & SEQUENCE_MASK,
+    )
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # fork出的子进程（如gunicorn工作进程）不能沿用父进程的生成器和机器号，需重新占用槽位并创建生成器
+    global _generator, _generator_lock, _worker_lock_fd
+    _generator = None
+    _generator_lock = threading.Lock()
+    if _worker_lock_fd is not None:
+        # 只关闭子进程继承的描述符副本，父进程仍持有自己的锁
+        os.close(_worker_lock_fd)
+        _worker_lock_fd = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def next_id():
+    """使用进程级生成器生成下一个编号"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = SnowflakeGenerator(default_worker_id())
+    return _generator.next_id()